@@ -1,14 +1,105 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Optional, Iterable, Iterator
 import logging
-from renko_generator import RenkoGenerator
-from strategy import RenkoStrategy
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
+import multiprocessing
+import os
+from itertools import chain, islice, product
+from renko_generator import RenkoGenerator, _build_renko
+from strategy import RenkoStrategy, _eval_grid
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from config import RenkoConfig
+from logger_config import setup_queue_logger, start_queue_listener
+import numba
+
+logger = logging.getLogger(__name__)
+
+# 工作进程内共享的只读参数，由 _init_worker 在进程启动时设置一次
+_worker_options = None
+_worker_initial_capital = None
+_worker_arrays = None
+
+
+def _init_worker(options, initial_capital, arrays, log_queue, numba_threads):
+    """工作进程初始化：日志转发到主进程队列，限定组合并行计算的线程数，并保存共享参数和K线数组"""
+    setup_queue_logger(log_queue)
+    numba.set_num_threads(numba_threads)
+    _set_worker_state(options, initial_capital, arrays)
+
+
+def _set_worker_state(options, initial_capital, arrays):
+    """设置 _run_task_group 使用的共享参数和K线数组，工作进程和主进程内执行共用"""
+    global _worker_options, _worker_initial_capital, _worker_arrays
+    _worker_options = options
+    _worker_initial_capital = initial_capital
+    _worker_arrays = arrays
+
+
+def _generate_group_renko(arrays, options, mode, period, multiplier) -> Tuple[pd.DataFrame, Optional[float]]:
+    """由预先提取的K线数组生成砖型图，砖型图只依赖(mode, period, multiplier)，返回(砖型图, 砖块大小)"""
+    if mode == 'daily':
+        renko_gen = RenkoGenerator(mode='daily', symbol=options['symbol'], save_data=options['save_data'])
+        renko_data = renko_gen.generate_renko_from_arrays(arrays)
+        brick_size = None
+    else:
+        renko_gen = RenkoGenerator(mode='atr', atr_period=period, atr_multiplier=multiplier, symbol=options['symbol'], save_data=options['save_renko_data'])
+        renko_data = renko_gen.generate_renko_from_arrays(arrays)
+        brick_size = renko_gen.get_brick_size() if not renko_data.empty else None
+    return renko_data, brick_size
+
+
+def _run_task_group(mode, period, multiplier, trend_pairs):
+    """
+    在工作进程中生成一次砖型图，并评估该砖型图下的全部趋势长度组合
+
+    Returns:
+        dict: 该组的按列结果（各组合的趋势长度、收益率、最后信号为ndarray），砖型图为空时返回None
+    """
+    if mode == 'daily':
+        logger.info(f"测试daily模式 - 趋势长度组合数: {len(trend_pairs)}")
+    else:
+        logger.info(f"=========测试ATR模式 - 周期: {period}, 倍数: {multiplier}, 趋势长度组合数: {len(trend_pairs)}=========")
+    renko_data, brick_size = _generate_group_renko(_worker_arrays, _worker_options, mode, period, multiplier)
+    if renko_data.empty:
+        logger.warning("砖型图数据为空，跳过此参数组合")
+        return None
+    buy_lens = np.array([pair[0] for pair in trend_pairs], dtype=np.int64)
+    sell_lens = np.array([pair[1] for pair in trend_pairs], dtype=np.int64)
+    returns, last_signals = _run_param_grid(renko_data, buy_lens, sell_lens)
+    return {
+        'mode': mode,
+        'atr_period': period,
+        'atr_multiplier': multiplier,
+        'brick_size': brick_size,
+        'last_signal_date': renko_data['date'].iloc[-1].strftime('%Y-%m-%d'),
+        'last_price': renko_data['close'].iloc[-1],
+        'buy_lens': buy_lens,
+        'sell_lens': sell_lens,
+        'returns': returns,
+        'last_signals': last_signals
+    }
+
+
+def _warm_up_kernels():
+    """在主进程中先调用一次JIT内核，编译结果写入磁盘缓存，工作进程启动后直接加载而无需各自编译"""
+    closes = np.array([1.0, 2.0, 3.0])
+    _build_renko(closes, 1.0)
+    _eval_grid(closes, np.ones(3), np.ones(1, dtype=np.int64), np.ones(1, dtype=np.int64), 1.0,
+               RenkoStrategy.LOT_SIZE, RenkoStrategy.COMMISSION_BUY, RenkoStrategy.COMMISSION_SELL)
+
+
+def _run_param_grid(renko_data, buy_lens, sell_lens):
+    """把砖型图转为ndarray后，在一次编译内核调用中评估全部趋势长度组合"""
+    close = renko_data['close'].to_numpy(np.float64)
+    trend = renko_data['trend'].to_numpy(np.float64)
+    return _eval_grid(close, trend, buy_lens, sell_lens, float(_worker_initial_capital),
+                      RenkoStrategy.LOT_SIZE, RenkoStrategy.COMMISSION_BUY, RenkoStrategy.COMMISSION_SELL)
+
 
 class BacktestOptimizer:
+    # 参数组合数不超过该值时在主进程内执行：2500根K线上6000组合单线程约0.5秒，低于进程池启动和重新导入的开销
+    IN_PROCESS_MAX_TASKS = 10000
+
     def __init__(self, data: pd.DataFrame, args: dict, config_path: str = "config/config.yaml"):
         """
         初始化回测优化器
@@ -22,16 +113,24 @@ class BacktestOptimizer:
         self.args = args
         self.config = RenkoConfig(config_path)
         self.initial_capital = self.config.initial_capital
+        self._arrays = RenkoGenerator.prepare_arrays(data)  # 各组参数共用的K线数组，只提取一次
+        # 生成砖型图所需的参数只解析一次，工作进程只接收这几个值而不是整个args
+        self._options = {
+            'symbol': args.symbol,
+            'save_data': bool(getattr(args, 'save_data', False)),
+            'save_renko_data': bool(getattr(args, 'save_renko_data', False))
+        }
         self.results = []
-        self.results_lock = threading.Lock()  # 用于线程安全的锁
+        self.returns = np.empty(0, dtype=np.float64)  # 与 results 一一对应的收益率列，用于排序和取最优（收益率相同时取靠后的组合）
         self.best_result = None
+        self._sorted_results = None  # 按收益率升序排列的结果，只排序一次
         self.logger = logging.getLogger(__name__)
         self._apply_args_to_config()
         self._log_config()
 
     def _apply_args_to_config(self):
         if self.args.threads is not None:
-            self.logger.info(f"**********使用--threads {self.args.threads}个线程**********")
+            self.logger.info(f"**********使用--threads {self.args.threads}个工作进程**********")
             self.config.max_threads = self.args.threads
         if self.args.max_iterations is not None:
             self.logger.info(f"**********使用--max_iterations {self.args.max_iterations}次迭代**********")
@@ -41,7 +140,7 @@ class BacktestOptimizer:
         self.logger.info("**********************本次优化器配置参数**********************")
         self.logger.info(f"初始资金: {self.initial_capital}")
         self.logger.info(f"最大迭代次数: {self.config.max_iterations}")
-        self.logger.info(f"最大线程数: {self.config.max_threads}")
+        self.logger.info(f"最大工作进程数: {self.config.max_threads}")
         self.logger.info(f"ATR周期选项: {self.config.atr_periods}")
         self.logger.info(f"ATR倍数选项: {self.config.atr_multipliers}")
         self.logger.info(f"趋势长度选项: {self.config.trend_lengths}")
@@ -52,83 +151,134 @@ class BacktestOptimizer:
         运行参数优化
         """
         self.logger.info("开始参数优化...")
-        tasks = self._generate_tasks()
-        tasks = tasks[:self.config.max_iterations]
+        tasks = islice(self._generate_tasks(), self.config.max_iterations)
         self._execute_tasks(tasks)
         self._print_optimization_results()
         
-    def _generate_tasks(self) -> List[Tuple]:
-        """生成所有参数组合任务"""
-        tasks = []
+    def _generate_tasks(self) -> Iterator[Tuple]:
+        """按需生成所有参数组合任务，买入/卖出趋势长度对策略不对称，需保留全部有序对；配置中的重复取值只保留一次"""
+        trend_lengths = list(dict.fromkeys(self.config.trend_lengths))
+        atr_periods = list(dict.fromkeys(self.config.atr_periods))
+        atr_multipliers = list(dict.fromkeys(self.config.atr_multipliers))
         # daily模式
-        for buy_length in self.config.trend_lengths:
-            for sell_length in self.config.trend_lengths:
-                tasks.append(('daily', None, None, buy_length, sell_length))
+        daily = (('daily', None, None, b, s) for b, s in product(trend_lengths, trend_lengths))
         # atr模式
-        for period in self.config.atr_periods:
-            for multiplier in self.config.atr_multipliers:
-                for buy_length in self.config.trend_lengths:
-                    for sell_length in self.config.trend_lengths:
-                        tasks.append(('atr', period, multiplier, buy_length, sell_length))
-        return tasks
-
-    def _execute_tasks(self, tasks: List[Tuple]):
-        """多线程执行所有参数组合任务"""
-        with ThreadPoolExecutor(max_workers=self.config.max_threads) as executor:
-            futures = []
-            for task in tasks:
-                mode, period, multiplier, buy_length, sell_length = task
-                if mode == 'daily':
-                    future = executor.submit(self._run_single_test, mode, None, None, buy_length, sell_length)
-                else:
-                    future = executor.submit(self._run_single_test, mode, period, multiplier, buy_length, sell_length)
-                futures.append(future)
-            for future in as_completed(futures):
+        atr = (('atr', p, m, b, s) for p, m, b, s in product(atr_periods, atr_multipliers, trend_lengths, trend_lengths))
+        return chain(daily, atr)
+
+    def _execute_tasks(self, tasks: Iterable[Tuple]):
+        """多进程执行所有参数组合任务，按砖型图分组提交，每组砖型图只在一个工作进程中生成一次"""
+        groups: Dict[Tuple, List[Tuple[int, int]]] = {}
+        for mode, period, multiplier, buy_length, sell_length in tasks:
+            groups.setdefault((mode, period, multiplier), []).append((buy_length, sell_length))
+        groups = {key: pairs for key, pairs in groups.items() if not self._yields_no_bricks(*key)}
+        if not groups:
+            return
+        cpu_budget = self._cpu_budget()
+        max_workers = self._effective_workers(len(groups), cpu_budget)
+        # 各工作进程平分本优化器可用的CPU核数用于趋势长度组合的并行计算，避免线程超额订阅
+        numba_threads = max(1, min(numba.config.NUMBA_NUM_THREADS, cpu_budget // max_workers))
+        if max_workers == 1 or sum(len(pairs) for pairs in groups.values()) <= self.IN_PROCESS_MAX_TASKS:
+            group_results = self._execute_in_process(groups, min(numba.config.NUMBA_NUM_THREADS, cpu_budget))
+        else:
+            group_results = self._execute_in_pool(groups, max_workers, numba_threads)
+        for group in group_results:
+            self._collect_group(group)
+        self.returns = np.concatenate([self.returns] + [group['returns'] for group in group_results])
+
+    def _execute_in_process(self, groups: Dict[Tuple, List[Tuple[int, int]]], numba_threads: int) -> List[Dict]:
+        """在主进程内逐组执行：只有一个工作进程或组合数很少时，省去启动进程和重新导入pandas/numba的开销"""
+        self.logger.info(f"参数组合较少，在主进程内执行 {len(groups)} 组任务")
+        previous_threads = numba.get_num_threads()
+        numba.set_num_threads(numba_threads)
+        _set_worker_state(self._options, self.initial_capital, self._arrays)
+        group_results = []
+        try:
+            for (mode, period, multiplier), trend_pairs in groups.items():
                 try:
-                    future.result()
+                    group = _run_task_group(mode, period, multiplier, trend_pairs)
                 except Exception as e:
                     self.logger.error(f"任务执行失败: {str(e)}")
+                    continue
+                if group is not None:
+                    group_results.append(group)
+        finally:
+            _set_worker_state(None, None, None)
+            numba.set_num_threads(previous_threads)
+        return group_results
 
-    def _run_single_test(self, mode, period, multiplier, buy_length, sell_length):
-        """统一处理单个参数组合的回测逻辑"""
+    def _execute_in_pool(self, groups: Dict[Tuple, List[Tuple[int, int]]], max_workers: int, numba_threads: int) -> List[Dict]:
+        """在spawn方式启动的进程池中执行，每组砖型图只在一个工作进程中生成一次"""
+        _warm_up_kernels()
+        # 主进程已启动Numba并行线程池，fork出的子进程可能死锁，工作进程固定用spawn方式启动
+        mp_context = multiprocessing.get_context('spawn')
+        # 工作进程的日志经队列交给主进程单线程输出，避免多进程同时写日志文件
+        log_queue = mp_context.Queue()
+        listener = start_queue_listener(log_queue)
+        group_results = []
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context, initializer=_init_worker,
+                                     initargs=(self._options, self.initial_capital, self._arrays, log_queue, numba_threads)) as executor:
+                futures = [executor.submit(_run_task_group, mode, period, multiplier, trend_pairs)
+                           for (mode, period, multiplier), trend_pairs in groups.items()]
+                for future in as_completed(futures):
+                    try:
+                        group = future.result()
+                    except Exception as e:
+                        self.logger.error(f"任务执行失败: {str(e)}")
+                        continue
+                    if group is not None:
+                        group_results.append(group)
+        finally:
+            listener.stop()
+        return group_results
+
+    def _yields_no_bricks(self, mode, period, multiplier) -> bool:
+        """在主进程中预判砖型图是否必然为空，为空的参数组不再提交给工作进程"""
+        closes = self._arrays['close']
         if mode == 'daily':
-            self.logger.info(f"测试daily模式 - 买入趋势长度: {buy_length}, 卖出趋势长度: {sell_length}")
-            renko_gen = RenkoGenerator(mode='daily', symbol=self.args.symbol, save_data=getattr(self.args, 'save_data', False))
-            renko_data = renko_gen.generate_renko(self.data)
-            brick_size = None
+            price_change = np.diff(closes)
+            empty = not ((price_change > 0) | (price_change < 0)).any()
         else:
-            self.logger.info(f"=========测试ATR模式 - 周期: {period}, 倍数: {multiplier}, 买入趋势长度: {buy_length}, 卖出趋势长度: {sell_length}=========")
-            renko_gen = RenkoGenerator(mode='atr', atr_period=period, atr_multiplier=multiplier, symbol=self.args.symbol, save_data=getattr(self.args, 'save_renko_data', False))
-            renko_data = renko_gen.generate_renko(self.data)
-            brick_size = renko_gen.get_brick_size() if not renko_data.empty else None
-        if renko_data.empty:
-            self.logger.warning("砖型图数据为空，跳过此参数组合")
-            return
-        strategy = RenkoStrategy(buy_trend_length=buy_length, sell_trend_length=sell_length, symbol=self.args.symbol, save_data=getattr(self.args, 'save_data', False))
-        signals = strategy.calculate_signals(renko_data)
-        portfolio = strategy.backtest(renko_data, signals, self.initial_capital)
-        final_return = (portfolio.iloc[-1]['total'] - self.initial_capital) / self.initial_capital
-        result = {
-            'symbol': self.args.symbol,
-            'start_date': self.args.start_date,
-            'end_date': self.args.end_date,
-            'mode': mode,
-            'atr_period': period,
-            'atr_multiplier': multiplier,
-            'buy_trend_length': buy_length,
-            'sell_trend_length': sell_length,
-            'return': final_return,
-            'portfolio': portfolio,
-            'brick_size': brick_size,
-            'last_signal': signals.iloc[-1].signal,
-            'last_signal_date': signals.iloc[-1].date.strftime('%Y-%m-%d'),
-            'last_price': renko_data.iloc[-1].close
-        }
-        if mode == 'atr':
-            result['renko_data'] = renko_data
-            result['signals'] = signals
-        with self.results_lock:
-            self.results.append(result)
+            brick_size = RenkoGenerator(mode='atr', atr_period=period, atr_multiplier=multiplier)._calculate_atr(self._arrays['true_range'])
+            # 生成第一块砖前基准价保持为首日收盘价，所有收盘价都达不到一块砖的距离即不会生成任何砖块
+            empty = brick_size == 0 or not (np.abs((closes[1:] - closes[0]) / brick_size) >= 1).any()
+        if empty:
+            self.logger.debug(f"砖型图必然为空，跳过参数组 - 模式: {mode}, 周期: {period}, 倍数: {multiplier}")
+        return empty
+
+    def _cpu_budget(self) -> int:
+        """本优化器可用的CPU核数：批量回测时外层已有 --workers 个进程各自运行优化器，按外层进程数平分"""
+        outer_workers = max(1, getattr(self.args, 'workers', 1) or 1) if getattr(self.args, 'symbol_list', None) else 1
+        return max(1, (os.cpu_count() or 1) // outer_workers)
+
+    def _effective_workers(self, n_groups: int, cpu_budget: int) -> int:
+        """工作进程数不超过可用CPU核数和任务组数：进程启动需重新导入pandas/numba，多余进程只增加开销"""
+        requested = self.config.max_threads
+        effective = max(1, min(requested, cpu_budget, n_groups))
+        if effective != requested:
+            self.logger.info(f"工作进程数由 {requested} 调整为 {effective}（可用CPU核数: {cpu_budget}, 任务组数: {n_groups}）")
+        return effective
+
+    def _collect_group(self, group: Dict):
+        """把工作进程返回的按列结果展开为各参数组合的结果字典"""
+        for buy_length, sell_length, final_return, last_signal in zip(
+                group['buy_lens'].tolist(), group['sell_lens'].tolist(), group['returns'].tolist(), group['last_signals'].tolist()):
+            self.results.append({
+                'symbol': self.args.symbol,
+                'start_date': self.args.start_date,
+                'end_date': self.args.end_date,
+                'mode': group['mode'],
+                'atr_period': group['atr_period'],
+                'atr_multiplier': group['atr_multiplier'],
+                'buy_trend_length': buy_length,
+                'sell_trend_length': sell_length,
+                'return': final_return,
+                'brick_size': group['brick_size'],
+                'last_signal': last_signal,
+                'last_signal_date': group['last_signal_date'],
+                'last_price': group['last_price']
+            })
 
     def _print_optimization_results(self):
         """输出优化结果"""
@@ -142,11 +292,14 @@ class BacktestOptimizer:
             mode_str += f", 买入趋势长度: {result['buy_trend_length']}, 卖出趋势长度: {result['sell_trend_length']}"
             self.logger.info(f"{i}. {mode_str}")
             self.logger.info(f"收益率: {result['return']:.2%}")
-        self.best_result = sorted_results[-1]
+        self.get_best_result()
         self._log_best_result()
 
     def _get_sorted_results(self):
-        return sorted(self.results, key=lambda x: x['return'], reverse=False)
+        if self._sorted_results is None:
+            order = np.argsort(self.returns, kind='stable')
+            self._sorted_results = [self.results[i] for i in order]
+        return self._sorted_results
 
     def _log_best_result(self):
         r = self.best_result
@@ -171,9 +324,29 @@ class BacktestOptimizer:
         self.logger.info(f"运行参数: {params_str}")
         self.logger.info("===========================================================")
 
+    def replay_best(self) -> Dict:
+        """
+        用最优参数组合重新运行一次策略回测，补全绘图所需的 portfolio/renko_data/signals 数据。
+        参数扫描结果中不保留各组合的 portfolio，避免内存随组合数增长。
+
+        Returns:
+            Dict: 带完整数据的最优结果
+        """
+        best = self.get_best_result()
+        if 'portfolio' in best:
+            return best
+        renko_data, _ = _generate_group_renko(self._arrays, self._options, best['mode'], best['atr_period'], best['atr_multiplier'])
+        strategy = RenkoStrategy(buy_trend_length=best['buy_trend_length'], sell_trend_length=best['sell_trend_length'],
+                                 symbol=self.args.symbol, save_data=self._options['save_data'])
+        signals = strategy.calculate_signals(renko_data)
+        best['portfolio'] = strategy.backtest(renko_data, signals, self.initial_capital)
+        best['renko_data'] = renko_data
+        best['signals'] = signals
+        return best
+
     def get_best_result(self) -> Dict:
         """获取最优参数组合"""
         if self.best_result is None:
-            sorted_results = self._get_sorted_results()
-            self.best_result = sorted_results[-1]
+            # 只取最优结果时无需整体排序；收益率相同时与稳定升序排序的末尾一致，取最后一个
+            self.best_result = self.results[len(self.returns) - 1 - int(np.argmax(self.returns[::-1]))]
         return self.best_result 
\ No newline at end of file
@@ -1,7 +1,13 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+import copy
 import yaml
 import os
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 class RenkoConfig:
     DEFAULT_CONFIG: Dict[str, Any] = {
         'use_db_cache': True,
@@ -20,6 +26,7 @@ class RenkoConfig:
             'trend_lengths': [2, 3, 5]
         }
     }
+    _parsed_cache: Dict[Tuple[str, float], Dict[str, Any]] = {}  # (配置文件路径, 修改时间) -> 解析结果
 
     def __init__(self, config_path: str = "config/config.yaml") -> None:
         """
@@ -32,18 +39,25 @@ class RenkoConfig:
 
     def _load_config(self) -> None:
         """从YAML文件加载配置，如不存在则使用默认配置"""
-        if not os.path.exists(self.config_path):
+        try:
+            config = self._read_config_file()
+        except FileNotFoundError:
             self._apply_config(self.DEFAULT_CONFIG)
             self._ensure_config_dir()
             self.save_config()
-        else:
-            try:
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    config = yaml.safe_load(f) or {}
-                self._apply_config(config)
-            except Exception as e:
-                print(f"加载配置文件失败，使用默认配置: {e}")
-                self._apply_config(self.DEFAULT_CONFIG)
+            return
+        except Exception as e:
+            print(f"加载配置文件失败，使用默认配置: {e}")
+            config = self.DEFAULT_CONFIG
+        self._apply_config(config)
+
+    def _read_config_file(self) -> Dict[str, Any]:
+        """解析YAML配置文件，文件未修改时复用上次的解析结果"""
+        key = (os.path.abspath(self.config_path), os.path.getmtime(self.config_path))
+        if key not in self._parsed_cache:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                RenkoConfig._parsed_cache[key] = yaml.load(f, Loader=SafeLoader) or {}
+        return copy.deepcopy(self._parsed_cache[key])
 
     def _ensure_config_dir(self) -> None:
         """确保配置文件目录存在"""
@@ -1,22 +1,50 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-import yfinance as yf
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
-import os
-import akshare as ak
 import json
 import logging
+import pickle
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from src.database import DataBase
-from typing import Optional, Dict, List, Union, Tuple, Any
+from typing import Optional, Dict, List, Union, Tuple, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import yfinance as yf
+
+# 内存缓存键：(股票代码, 开始日期, 结束日期, 数据间隔)
+CacheKey = Tuple[str, str, str, str]
+
+# 文件缓存优先使用parquet，未安装pyarrow时退回csv
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
 
 class DataFetcher:
     # 配置常量
     SUPPORTED_INTERVALS = ['1d', '1wk', '1mo']
     INTERVAL_TO_PERIOD_MAP = {'1d': 'daily', '1wk': 'weekly', '1mo': 'monthly'}
+    AKSHARE_COLUMN_MAP = {
+        '日期': 'Date',
+        '开盘': 'Open',
+        '收盘': 'Close',
+        '最高': 'High',
+        '最低': 'Low',
+        '成交量': 'Volume',
+        '成交额': 'Turnover',
+    }
     DEFAULT_CACHE_DIR = 'data'
     DEFAULT_QUERY_METHOD = 'yfinance'
+    MAX_MEM_CACHE_ENTRIES = 256  # 内存缓存最多保留的数据框个数，超出时淘汰最久未使用的
+    MAX_MEM_CACHE_BYTES = 512 * 1024 * 1024  # 内存缓存占用内存上限，超出时同样按最久未使用淘汰
+    MAX_NET_FETCH_WORKERS = 4  # 并发网络请求数上限，避免触发数据源的限流
+    YF_BATCH_SIZE = 20  # 单次yfinance批量下载的股票数，分块后一块失败不影响其余股票
     
     def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, use_db_cache: bool = True, 
                  use_csv_cache: bool = False, query_method: str = DEFAULT_QUERY_METHOD) -> None:
@@ -29,23 +57,35 @@ class DataFetcher:
             use_csv_cache (bool): 是否使用本地csv缓存
             query_method (str): 数据源方式
         """
-        self.data_cache: Dict[str, pd.DataFrame] = {}
+        self.data_cache: OrderedDict[CacheKey, pd.DataFrame] = OrderedDict()
+        self.data_cache_sizes: Dict[CacheKey, int] = {}  # 缓存键 -> 数据框占用字节数
+        self.data_cache_bytes: int = 0
+        # (股票代码, 间隔) -> {缓存键: (开始日期, 结束日期)}，日期预先解析，查找覆盖区间时只遍历同一股票的缓存项
+        self.data_cache_ranges: Dict[Tuple[str, str], Dict[CacheKey, Tuple[pd.Timestamp, pd.Timestamp]]] = {}
         self.symbol_info_db: Dict[str, str] = {}
+        self.yf_tickers: Dict[str, 'yf.Ticker'] = {}
+        self.db_bounds_cache: Dict[Tuple[str, str], Tuple[str, str]] = {}  # (股票代码, 间隔) -> 库中数据的首末日期
         self.use_db_cache: bool = use_db_cache
         self.use_csv_cache: bool = use_csv_cache
         self.query_method: str = query_method
         
         # 创建缓存目录
         self.cache_dir: str = cache_dir
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
+        os.makedirs(cache_dir, exist_ok=True)
         
         # 初始化文件路径
         self._init_file_paths()
         
-        # 初始化数据库和日志
-        self.db: DataBase = DataBase(os.path.join(self.cache_dir, 'stock_hist_data.db'))
+        # 数据库在首次访问时才打开连接
+        self._db: Optional[DataBase] = None
         self.logger: logging.Logger = logging.getLogger(__name__)
+
+    @property
+    def db(self) -> DataBase:
+        """数据库连接，首次访问时创建"""
+        if self._db is None:
+            self._db = DataBase(os.path.join(self.cache_dir, 'stock_hist_data.db'))
+        return self._db
             
     def _init_file_paths(self) -> None:
         """初始化所有文件路径"""
@@ -54,40 +94,105 @@ class DataFetcher:
         self.FILE_STOCK_INFO_SZ: str = os.path.join(self.cache_dir, "stock_info_sz.csv")
         self.FILE_STOCK_INFO_HK: str = os.path.join(self.cache_dir, "stock_info_hk.csv")
         self.FILE_STOCK_INFO_AH_CODE_NAME: str = os.path.join(self.cache_dir, "stock_info_ah_symbol_name.csv")
+        self.FILE_STOCK_INFO_AH_CODE_NAME_PKL: str = os.path.join(self.cache_dir, "stock_info_ah_symbol_name.pkl")
         self.FILE_STOCK_AH_SYMBOLS_ALL: str = os.path.join(self.cache_dir, "stock_ah_symbols_all.json")
         
     def _get_cache_filename(self, symbol: str, start_date: str, end_date: str, interval: str) -> str:
         """生成缓存文件名"""
-        return os.path.join(self.cache_dir, f"{symbol}_{start_date}_{end_date}_{interval}.csv")
+        suffix = '.parquet' if PARQUET_AVAILABLE else '.csv'
+        return os.path.join(self.cache_dir, f"{symbol}_{start_date}_{end_date}_{interval}{suffix}")
         
     def _load_from_cache(self, cache_file: str) -> Optional[pd.DataFrame]:
-        """从缓存文件加载数据"""
-        if os.path.exists(cache_file):
+        """从缓存文件加载数据，parquet文件不存在时兼容读取旧版csv缓存，并转存为parquet"""
+        # 直接打开文件，不存在时捕获异常，省去每次查询前的stat探测
+        legacy_csv_file = os.path.splitext(cache_file)[0] + '.csv'
+        try:
+            if not cache_file.endswith('.parquet'):
+                return self._read_csv_cache(legacy_csv_file)
             try:
-                df = pd.read_csv(cache_file, index_col=0, parse_dates=True)
-                return df
-            except Exception as e:
-                self.logger.error(f"读取缓存文件失败: {str(e)}")
+                return pd.read_parquet(cache_file, engine='pyarrow')
+            except FileNotFoundError:
+                df = self._read_csv_cache(legacy_csv_file)
+            # 旧版csv缓存只解析一次，之后直接读parquet
+            self._save_to_cache(df, cache_file)
+            self.logger.info(f"旧版csv缓存已转存为parquet: {legacy_csv_file} -> {cache_file}")
+            return df
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.error(f"读取缓存文件失败: {str(e)}")
         return None
         
+    @staticmethod
+    def _read_csv_cache(csv_file: str) -> pd.DataFrame:
+        """读取csv缓存文件，安装了pyarrow时用其多线程解析器"""
+        if not PARQUET_AVAILABLE:
+            return pd.read_csv(csv_file, index_col=0, parse_dates=True)
+        df = pd.read_csv(csv_file, engine='pyarrow', index_col=0)
+        df.index = pd.to_datetime(df.index)
+        return df
+
     def _save_to_cache(self, df: pd.DataFrame, cache_file: str) -> None:
-        """保存数据到缓存文件"""
+        """保存数据到缓存文件（parquet列式存储，保留类型并压缩；未安装pyarrow时为csv）"""
         try:
-            df.to_csv(cache_file)
+            if cache_file.endswith('.parquet'):
+                df.to_parquet(cache_file, engine='pyarrow', compression='zstd')
+            else:
+                df.to_csv(cache_file)
         except Exception as e:
             self.logger.error(f"保存缓存文件失败: {str(e)}")
 
-    def _get_cache_key(self, symbol: str, start_date: str, end_date: str, interval: str) -> str:
+    def _get_cache_key(self, symbol: str, start_date: str, end_date: str, interval: str) -> CacheKey:
         """生成缓存键"""
-        return f"{symbol}_{start_date}_{end_date}_{interval}"
-
-    def _get_from_memory_cache(self, cache_key: str) -> Optional[pd.DataFrame]:
-        """从内存缓存获取数据"""
-        return self.data_cache.get(cache_key)
+        return symbol, start_date, end_date, interval
+
+    def _get_from_memory_cache(self, cache_key: CacheKey) -> Optional[pd.DataFrame]:
+        """从内存缓存获取数据，命中时标记为最近使用；没有完全相同的键时，从覆盖该日期范围的缓存数据中截取"""
+        df = self.data_cache.get(cache_key)
+        if df is not None:
+            self.data_cache.move_to_end(cache_key)
+            return df
+
+        symbol, start_date, end_date, interval = cache_key
+        ranges = self.data_cache_ranges.get((symbol, interval))
+        if not ranges:
+            return None
+        start, end = self._parse_date(start_date), self._parse_date(end_date)
+        for cached_key, (cached_start, cached_end) in reversed(ranges.items()):
+            if cached_start <= start and end <= cached_end:
+                self.data_cache.move_to_end(cached_key)
+                return self.data_cache[cached_key].loc[start:end]
+        return None
 
-    def _save_to_memory_cache(self, cache_key: str, df: pd.DataFrame) -> None:
-        """保存数据到内存缓存"""
+    def _save_to_memory_cache(self, cache_key: CacheKey, df: pd.DataFrame) -> None:
+        """保存数据到内存缓存，超出个数或内存上限时淘汰最久未使用的数据，最新写入的一项总是保留"""
+        size = int(df.memory_usage(deep=True).sum())
+        self.data_cache_bytes += size - self.data_cache_sizes.get(cache_key, 0)
+        self.data_cache_sizes[cache_key] = size
         self.data_cache[cache_key] = df
+        self.data_cache.move_to_end(cache_key)
+        symbol, start_date, end_date, interval = cache_key
+        self.data_cache_ranges.setdefault((symbol, interval), {})[cache_key] = (self._parse_date(start_date), 
+                                                                               self._parse_date(end_date))
+        while len(self.data_cache) > 1 and (len(self.data_cache) > self.MAX_MEM_CACHE_ENTRIES or 
+                                            self.data_cache_bytes > self.MAX_MEM_CACHE_BYTES):
+            evicted_key, _ = self.data_cache.popitem(last=False)
+            self._forget_memory_cache_key(evicted_key)
+
+    def _forget_memory_cache_key(self, cache_key: CacheKey) -> None:
+        """从字节数统计和日期区间索引中移除已不在内存缓存中的键"""
+        self.data_cache_bytes -= self.data_cache_sizes.pop(cache_key)
+        symbol, _, _, interval = cache_key
+        ranges = self.data_cache_ranges[(symbol, interval)]
+        del ranges[cache_key]
+        if not ranges:
+            del self.data_cache_ranges[(symbol, interval)]
+
+    def _invalidate_memory_cache(self, symbol: str, interval: str) -> None:
+        """股票数据即将从网络更新入库时，丢弃该股票已有的内存缓存，避免之后从旧数据中截取"""
+        for cache_key in list(self.data_cache_ranges.get((symbol, interval), ())):
+            del self.data_cache[cache_key]
+            self._forget_memory_cache_key(cache_key)
 
     def _get_from_db_cache(self, symbol: str, start_date: str, end_date: str, interval: str) -> Optional[pd.DataFrame]:
         """从数据库缓存获取数据"""
@@ -103,6 +208,16 @@ class DataFetcher:
             self.db.update(symbol, df, interval)
         else:
             self.db.insert(symbol, df, interval)
+        self.db_bounds_cache.pop((symbol, interval), None)
+
+    def _get_db_bounds(self, adj_symbols: List[str], interval: str) -> Dict[str, Tuple[str, str]]:
+        """获取各股票在库中数据的首末日期，进程内缓存，只查询未缓存的股票；库中没有数据的股票不包含在结果中"""
+        missing = [adj_symbol for adj_symbol in adj_symbols if (adj_symbol, interval) not in self.db_bounds_cache]
+        if missing:
+            for adj_symbol, bounds in self.db.get_date_bounds_many(missing, interval).items():
+                self.db_bounds_cache[(adj_symbol, interval)] = bounds
+        return {adj_symbol: self.db_bounds_cache[(adj_symbol, interval)] for adj_symbol in adj_symbols
+                if (adj_symbol, interval) in self.db_bounds_cache}
 
     def _get_from_file_cache(self, symbol: str, start_date: str, end_date: str, interval: str) -> Optional[pd.DataFrame]:
         """从文件缓存获取数据"""
@@ -127,12 +242,15 @@ class DataFetcher:
             query_df['Turnover'] = -1
 
         # Date列去掉时区，只保留日期
-        query_df['Date'] = query_df['Date'].dt.date
-        query_df['Date'] = pd.to_datetime(query_df['Date'])
+        query_df['Date'] = pd.to_datetime(query_df['Date']).dt.tz_localize(None).dt.normalize()
         query_df.set_index('Date', inplace=True)
 
+        # 下游砖型图、ATR计算均假设日期升序，数据源返回乱序时在此统一排序一次
+        if not query_df.index.is_monotonic_increasing:
+            query_df.sort_index(inplace=True)
+
         # 添加入库时间戳
-        query_df['Timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        query_df['Timestamp'] = pd.Timestamp.now().floor('s')
 
         self.logger.info(f"[DONE]获取了 {symbol}@{query_df.index.min()} -> {query_df.index.max()} 的 {len(query_df)} 条数据")
         return query_df
@@ -143,44 +261,46 @@ class DataFetcher:
         if query_df is None or query_df.empty:
             return
 
-        # 保存到文件缓存
-        if self.use_csv_cache:
+        # 保存到文件缓存；启用数据库缓存时数据库是唯一的持久化来源，且总是先于文件缓存被查询，不再重复写文件
+        if self.use_csv_cache and not self.use_db_cache:
             cache_file = self._get_cache_filename(symbol, start_date, end_date, interval)
             self._save_to_cache(query_df, cache_file)
 
-        # 保存到内存缓存
+        # 保存到内存缓存，该股票之前缓存的数据可能已被本次结果更新
         cache_key = self._get_cache_key(symbol, start_date, end_date, interval)
+        self._invalidate_memory_cache(symbol, interval)
         self._save_to_memory_cache(cache_key, query_df)
 
         # 保存到数据库
         if self.use_db_cache:
             self._save_to_db_cache(symbol, query_df, interval)
 
-    def _get_db_first_date(self, symbol: str, interval: str = '1d') -> Optional[datetime]:
-        """
-        获取第一条数据日期
-        """
-        db_first_date = self.db.get_first_date(symbol, interval)
-        if db_first_date is None:
-            return None
-        else:
-            return pd.to_datetime(db_first_date)
-
-    def _get_db_last_date(self, symbol: str, interval: str = '1d') -> Optional[datetime]:
-        """
-        检查最后一条数据日期
-        """
-        db_last_date = self.db.get_last_date(symbol, interval)
-        if db_last_date is None:
-            return None
-        else:
-            return pd.to_datetime(db_last_date)
-        
     def _prepare_params(self, symbol: str, start_date: str, end_date: Optional[str], 
                        interval: str) -> Tuple[str, str, str, str]:
         """
         入参检查和处理
         """
+        if end_date is None:
+            end_date = datetime.now().strftime('%Y-%m-%d')
+
+        adj_symbol, adj_start_date, adj_end_date, interval = self._normalize_params(symbol, start_date, end_date, interval)
+
+        # 如果start_date不是工作日，则调整为最近一个工作日
+        if adj_start_date != start_date:
+            self.logger.info(f"start_date不是工作日，调整为最近一个工作日: {start_date} -> {adj_start_date}")
+
+        # 如果end_date不是工作日，则调整为最近一个工作日
+        if adj_end_date != end_date:
+            self.logger.info(f"end_date不是工作日，调整为最近一个工作日: {end_date} -> {adj_end_date}")
+
+        return adj_symbol, adj_start_date, adj_end_date, interval
+
+    @staticmethod
+    @lru_cache(maxsize=8192)
+    def _normalize_params(symbol: str, start_date: str, end_date: str, interval: str) -> Tuple[str, str, str, str]:
+        """
+        规范化股票代码并把起止日期调整到工作日，结果按原始参数缓存
+        """
         adj_symbol = symbol
         adj_start_date = start_date
         adj_end_date = end_date
@@ -192,18 +312,11 @@ class DataFetcher:
         elif not symbol.isdigit():
             raise ValueError(f"不支持的股票代码: {symbol}")
 
-        if end_date is None:
-            adj_end_date = datetime.now().strftime('%Y-%m-%d')
-
-        # 如果start_date不是工作日，则调整为最近一个工作日
-        if not self._is_workday(start_date):
-            adj_start_date = self._get_nearest_workday_forward(start_date)
-            self.logger.info(f"start_date不是工作日，调整为最近一个工作日: {start_date} -> {adj_start_date}")
+        if not DataFetcher._is_workday(start_date):
+            adj_start_date = DataFetcher._get_nearest_workday_forward(start_date)
 
-        # 如果end_date不是工作日，则调整为最近一个工作日
-        if not self._is_workday(end_date):
-            adj_end_date = self._get_nearest_workday_backward(end_date)
-            self.logger.info(f"end_date不是工作日，调整为最近一个工作日: {end_date} -> {adj_end_date}")
+        if not DataFetcher._is_workday(end_date):
+            adj_end_date = DataFetcher._get_nearest_workday_backward(end_date)
         
         # interval到period的映射，用于兼容akshare接口
         interval_valid = ['1d', '1wk', '1mo']
@@ -218,53 +331,110 @@ class DataFetcher:
         根据参数准备数据库的数据，对比数据库和网络最新数据，并更新到数据库
         返回True表示数据库数据就绪，False标识失败。
         """
+        return self.prepare_db_data_batch([symbol], start_date, end_date, interval)[symbol]
+
+    def prepare_db_data_batch(self, symbols: List[str], start_date: str, end_date: Optional[str] = None, 
+                              interval: str = '1d') -> Dict[str, bool]:
+        """
+        批量准备多只股票的数据库数据：数据库查询对全部股票各只执行一次，
+        缺数据的股票在yfinance模式下合并为一次网络请求
+        
+        Returns:
+            Dict[str, bool]: 股票代码 -> 是否从网络获取并保存了新数据
+        """
+        if not symbols:
+            return {}
+
         # 入参检查和处理
-        adj_symbol, adj_start_date, adj_end_date, interval = self._prepare_params(symbol, start_date, end_date, interval)
+        params = {symbol: self._prepare_params(symbol, start_date, end_date, interval) for symbol in symbols}
         
         if not self.use_db_cache:
             # 如果不用数据库，则直接返回
             self.logger.info(f"不使用数据库缓存，直接返回False")
-            return False
-        need_update_data = False
+            return {symbol: False for symbol in symbols}
+
+        # 全部股票的请求日期范围相同，一次取出库中数据和各股票的数据日期范围
+        _, adj_start_date, adj_end_date, interval = next(iter(params.values()))
+        adj_symbols = list(dict.fromkeys(adj_symbol for adj_symbol, _, _, _ in params.values()))
+        db_dfs = self.db.fetch_many(adj_symbols, adj_start_date, adj_end_date, interval)
+        db_bounds = self._get_db_bounds(adj_symbols, interval)
+
+        results: Dict[str, bool] = {}
+        to_fetch: Dict[str, Tuple[str, str, str, bool]] = {}  # 原始代码 -> (处理后代码, 开始日期, 结束日期, 是否更新)
+        for symbol, (adj_symbol, _, _, _) in params.items():
+            plan = self._plan_db_update(adj_symbol, adj_start_date, adj_end_date,
+                                        db_dfs.get(adj_symbol, pd.DataFrame()), db_bounds.get(adj_symbol))
+            if plan is None:
+                results[symbol] = False
+            else:
+                to_fetch[symbol] = (adj_symbol, *plan)
 
+        if to_fetch:
+            fetch_params = list(dict.fromkeys(plan[:3] for plan in to_fetch.values()))
+            if self.query_method == 'yfinance' and len(fetch_params) > 1:
+                query_dfs = self._query_stock_data_from_net_batch(fetch_params, interval)
+            else:
+                query_dfs = self._query_stock_data_from_net_parallel(fetch_params, interval)
+            db_items, saved = [], []
+            for symbol, (adj_symbol, fetch_start_date, fetch_end_date, need_update_data) in to_fetch.items():
+                query_df = query_dfs.get((adj_symbol, fetch_start_date, fetch_end_date))
+                query_df = self._process_db_update(query_df, adj_symbol, fetch_start_date, fetch_end_date, interval)
+                results[symbol] = query_df is not None
+                if query_df is not None:
+                    db_items.append((adj_symbol, query_df, need_update_data))
+                    saved.append((adj_symbol, fetch_start_date, fetch_end_date))
+
+            # 所有股票的写入合并为一个事务
+            if db_items and self.use_db_cache:
+                self.db.write_many(db_items, interval)
+                for adj_symbol, _, _ in db_items:
+                    self.db_bounds_cache.pop((adj_symbol, interval), None)
+                for adj_symbol, fetch_start_date, fetch_end_date in saved:
+                    self.logger.info(f"[DONE]股票{adj_symbol}@{fetch_start_date} -> {fetch_end_date}的数据已保存到数据库")
+
+        return {symbol: results[symbol] for symbol in symbols}
+
+    def _plan_db_update(self, adj_symbol: str, adj_start_date: str, adj_end_date: str, db_df: pd.DataFrame, 
+                        db_bounds: Optional[Tuple[str, str]]) -> Optional[Tuple[str, str, bool]]:
+        """
+        对比数据库中的数据，确定需要从网络获取的日期范围
+        
+        Returns:
+            tuple: (开始日期, 结束日期, 是否需要update)，数据库数据已就绪时返回None
+        """
         # 数据库中有数据不是最终收盘数据，检查记录的入库时间戳，标注要执行update动作。
-        db_df = pd.DataFrame()
-        db_df = self._get_from_db_cache(adj_symbol, adj_start_date, adj_end_date, interval)
         need_update_data = self._check_db_record_timestamp(db_df, adj_symbol)
 
-        # 开始检查数据库数据情况
-        db_start_date = self._get_db_first_date(adj_symbol, interval)
-        db_end_date = self._get_db_last_date(adj_symbol, interval)
-
         # 检查数据库中是否包含start_date到end_date的数据
-        if not need_update_data and db_start_date is not None and db_end_date is not None:
+        if not need_update_data and db_bounds is not None:
+            db_start_date, db_end_date = self._parse_date(db_bounds[0]), self._parse_date(db_bounds[1])
             self.logger.info(f"[CHECK]股票{adj_symbol}最新历史数据范围: {db_start_date.strftime('%Y-%m-%d')} -> {db_end_date.strftime('%Y-%m-%d')}")
-            if pd.to_datetime(adj_start_date) >= db_start_date and db_end_date >= pd.to_datetime(adj_end_date):
+            if self._parse_date(adj_start_date) >= db_start_date and db_end_date >= self._parse_date(adj_end_date):
                 self.logger.info(f"[DONE]股票{adj_symbol}数据库中已包含 {adj_start_date} -> {adj_end_date} 的数据，数据就绪")
-                return False
+                return None
             adj_start_date, adj_end_date = self._adjust_date_range(adj_symbol, adj_start_date, adj_end_date, db_start_date, db_end_date)
     
         # 如果数据库中没有数据，则从网上获取数据
         self.logger.info(f"[TODO]: 数据库缺少股票{adj_symbol}@{adj_start_date} -> {adj_end_date}的数据")
-        query_df = pd.DataFrame()
-        query_df = self._query_stock_data_from_net(adj_symbol, adj_start_date, adj_end_date, interval)
-        if isinstance(query_df, bool) and query_df is False:
-            return False
+        return adj_start_date, adj_end_date, need_update_data
+
+    def _process_db_update(self, query_df: Optional[pd.DataFrame], adj_symbol: str, adj_start_date: str, 
+                           adj_end_date: str, interval: str) -> Optional[pd.DataFrame]:
+        """处理网络查询结果并保存到内存缓存，返回待写入数据库的数据"""
+        if query_df is None:
+            return None
         
         # 处理查询结果兼容性
         query_df = self._process_query_result(query_df, adj_symbol, adj_start_date, adj_end_date, interval)
         if query_df is None:
-            return False
-
-        # 保存到数据库
-        self._save_to_db_cache(adj_symbol, query_df, interval, update=need_update_data)
-        self.logger.info(f"[DONE]股票{adj_symbol}@{adj_start_date} -> {adj_end_date}的数据已保存到数据库")
+            return None
 
-        # 保存到内存缓存，下次匹配直接获取
+        # 保存到内存缓存，下次匹配直接获取；该股票之前缓存的数据随后会被写库更新，一并丢弃
         cache_key = self._get_cache_key(adj_symbol, adj_start_date, adj_end_date, interval)
+        self._invalidate_memory_cache(adj_symbol, interval)
         self._save_to_memory_cache(cache_key, query_df)
 
-        return True
+        return query_df
 
     def get_historical_data(self, symbol: str, start_date: str, end_date: Optional[str] = None, 
                            interval: str = '1d') -> Optional[pd.DataFrame]:
@@ -282,6 +452,54 @@ class DataFetcher:
         # 参数预处理
         adj_symbol, adj_start_date, adj_end_date, interval = self._prepare_params(symbol, start_date, end_date, interval)
         
+        # 1~3. 依次检查内存、数据库、文件缓存
+        cached_df = self._get_from_local_caches(adj_symbol, adj_start_date, adj_end_date, interval)
+        if cached_df is not None:
+            return cached_df
+        
+        # 4. 从网络获取数据
+        self.logger.info(f"[TODO]从网络获取股票{adj_symbol}@{adj_start_date} -> {adj_end_date}的数据")
+        query_df = self._query_stock_data_from_net(adj_symbol, adj_start_date, adj_end_date, interval)
+        
+        # 5. 处理并保存查询结果
+        return self._process_and_save_query_result(query_df, adj_symbol, adj_start_date, adj_end_date, interval)
+
+    def get_historical_data_batch(self, symbols: List[str], start_date: str, end_date: Optional[str] = None, 
+                                  interval: str = '1d') -> Dict[str, Optional[pd.DataFrame]]:
+        """
+        批量获取多只股票的历史数据，本地缓存未命中的股票在yfinance模式下合并为一次网络请求，其他数据源用线程池并发请求
+        
+        Args:
+            symbols (List[str]): 股票代码列表
+            start_date (str): 开始日期，格式为'YYYY-MM-DD'
+            end_date (str, optional): 结束日期，格式为'YYYY-MM-DD'，默认为今天
+            interval (str, optional): 数据间隔，可选值：'1d', '1wk', '1mo'
+        Returns:
+            Dict[str, pd.DataFrame]: 股票代码 -> 数据框，获取失败的股票对应None
+        """
+        results: Dict[str, Optional[pd.DataFrame]] = {}
+        missing: Dict[str, Tuple[str, str, str]] = {}  # 原始代码 -> (处理后代码, 开始日期, 结束日期)
+        for symbol in symbols:
+            adj_symbol, adj_start_date, adj_end_date, interval = self._prepare_params(symbol, start_date, end_date, interval)
+            results[symbol] = self._get_from_local_caches(adj_symbol, adj_start_date, adj_end_date, interval)
+            if results[symbol] is None:
+                missing[symbol] = (adj_symbol, adj_start_date, adj_end_date)
+        if not missing:
+            return results
+
+        self.logger.info(f"[TODO]从网络获取{len(missing)}只股票的数据")
+        fetch_params = list(dict.fromkeys(missing.values()))
+        if self.query_method == 'yfinance':
+            query_dfs = self._query_stock_data_from_net_batch(fetch_params, interval)
+        else:
+            query_dfs = self._query_stock_data_from_net_parallel(fetch_params, interval)
+        for symbol, params in missing.items():
+            results[symbol] = self._process_and_save_query_result(query_dfs.get(params), *params, interval)
+        return results
+
+    def _get_from_local_caches(self, adj_symbol: str, adj_start_date: str, adj_end_date: str, 
+                               interval: str) -> Optional[pd.DataFrame]:
+        """依次检查内存、数据库、文件缓存，命中时返回数据并回填到所有更高一级的缓存，否则返回None"""
         # 生成缓存键
         cache_key = self._get_cache_key(adj_symbol, adj_start_date, adj_end_date, interval)
         
@@ -302,14 +520,14 @@ class DataFetcher:
         csv_df = self._get_from_file_cache(adj_symbol, adj_start_date, adj_end_date, interval)
         if csv_df is not None and not csv_df.empty:
             self._save_to_memory_cache(cache_key, csv_df)
+            self._save_to_db_cache(adj_symbol, csv_df, interval)
             return csv_df
         self.logger.info(f"本地缓存中没有{adj_symbol}@{adj_start_date} - {adj_end_date}的数据") if self.use_csv_cache else None
-        
-        # 4. 从网络获取数据
-        self.logger.info(f"[TODO]从网络获取股票{adj_symbol}@{adj_start_date} -> {adj_end_date}的数据")
-        query_df = self._query_stock_data_from_net(adj_symbol, adj_start_date, adj_end_date, interval)
-        
-        # 5. 处理并保存查询结果
+        return None
+
+    def _process_and_save_query_result(self, query_df: Optional[pd.DataFrame], adj_symbol: str, adj_start_date: str, 
+                                       adj_end_date: str, interval: str) -> Optional[pd.DataFrame]:
+        """处理网络查询结果并保存到各级缓存，失败时返回None"""
         if query_df is not None:
             processed_df = self._process_query_result(query_df, adj_symbol, adj_start_date, adj_end_date, interval)
             if processed_df is not None:
@@ -339,20 +557,47 @@ class DataFetcher:
 
     def init_stock_info(self) -> dict:
         """
-        从数据库获取A股、科创板、深市、港股的股票信息，保存为csv和json文件。
+        获取A股、科创板、深市、港股的股票信息，优先读取pickle缓存，没有时从数据库加载并写入pickle缓存。
         """
         self.logger.info("初始化股票信息")
 
+        self.symbol_info_db = self._load_stock_info_pickle()
+        if self.symbol_info_db:
+            self.logger.info(f"已从pickle缓存加载stock_info_db = {len(self.symbol_info_db)}只股票信息")
+            return self.symbol_info_db
+
         # 从数据库获取股票信息
-        stock_info_db = pd.DataFrame(self.db.get_all_stock_info(), columns=['symbol', 'name'])
-        if not stock_info_db.empty:
-            self.symbol_info_db = dict(zip(stock_info_db['symbol'], stock_info_db['name']))
+        stock_info_db = self.db.get_all_stock_info()
+        if stock_info_db:
+            self.symbol_info_db = dict(stock_info_db)
             self.logger.info(f"已从数据库加载stock_info_db = {len(self.symbol_info_db)}只股票信息")
+            self._save_stock_info_pickle(self.symbol_info_db)
         else:
             self.logger.error("数据库中没有股票信息")
         
         return self.symbol_info_db
 
+    def _load_stock_info_pickle(self) -> Dict[str, str]:
+        """读取股票信息pickle缓存，不存在或损坏时返回空字典"""
+        try:
+            with open(self.FILE_STOCK_INFO_AH_CODE_NAME_PKL, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.logger.warning(f"读取股票信息pickle缓存失败: {str(e)}")
+            return {}
+
+    def _save_stock_info_pickle(self, symbol_info: Dict[str, str]) -> None:
+        """把股票信息字典写入pickle缓存，先写临时文件再替换，避免并发读到半个文件"""
+        tmp_file = f"{self.FILE_STOCK_INFO_AH_CODE_NAME_PKL}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(symbol_info, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self.FILE_STOCK_INFO_AH_CODE_NAME_PKL)
+        except Exception as e:
+            self.logger.warning(f"保存股票信息pickle缓存失败: {str(e)}")
+
     def _query_stock_data_from_net(self, adj_symbol: str, adj_start_date: str, adj_end_date: str, 
                                   interval: str) -> Optional[pd.DataFrame]:
         """
@@ -368,7 +613,7 @@ class DataFetcher:
             pd.DataFrame: 查询结果，如果失败返回None
         """
         # 调整结束日期，加1天以包含结束日期
-        adj_end_date = (pd.to_datetime(adj_end_date) + timedelta(days=1)).strftime('%Y-%m-%d')
+        adj_end_date = self._get_next_day(adj_end_date)
         
         try:
             if self.query_method == 'akshare':
@@ -387,6 +632,53 @@ class DataFetcher:
             self.logger.error(f"获取股票数据失败: {str(e)}")
             return None
 
+    def _query_stock_data_from_net_batch(self, params_list: List[Tuple[str, str, str]], 
+                                        interval: str) -> Dict[Tuple[str, str, str], pd.DataFrame]:
+        """
+        批量从网络获取股票数据，日期范围相同的股票合并为一次yfinance请求
+        
+        Args:
+            params_list (List[Tuple]): (处理后的股票代码, 开始日期, 结束日期) 列表
+            interval (str): 数据间隔
+            
+        Returns:
+            Dict: (股票代码, 开始日期, 结束日期) -> 查询结果，失败的股票不包含在内
+        """
+        by_range: Dict[Tuple[str, str], List[str]] = {}
+        for adj_symbol, adj_start_date, adj_end_date in params_list:
+            by_range.setdefault((adj_start_date, adj_end_date), []).append(adj_symbol)
+
+        query_dfs: Dict[Tuple[str, str, str], pd.DataFrame] = {}
+        for (adj_start_date, adj_end_date), adj_symbols in by_range.items():
+            # 调整结束日期，加1天以包含结束日期
+            query_end_date = self._get_next_day(adj_end_date)
+            for i in range(0, len(adj_symbols), self.YF_BATCH_SIZE):
+                chunk = adj_symbols[i:i + self.YF_BATCH_SIZE]
+                fetched = self._fetch_data_yfinance_batch(chunk, adj_start_date, query_end_date, interval)
+                for adj_symbol, query_df in fetched.items():
+                    query_dfs[(adj_symbol, adj_start_date, adj_end_date)] = query_df
+        return query_dfs
+
+    def _query_stock_data_from_net_parallel(self, params_list: List[Tuple[str, str, str]], 
+                                           interval: str) -> Dict[Tuple[str, str, str], Optional[pd.DataFrame]]:
+        """
+        用线程池并发逐只从网络获取股票数据，结果在调用线程中统一处理和入库
+        
+        Args:
+            params_list (List[Tuple]): (处理后的股票代码, 开始日期, 结束日期) 列表
+            interval (str): 数据间隔
+            
+        Returns:
+            Dict: (股票代码, 开始日期, 结束日期) -> 查询结果，失败时为None
+        """
+        if len(params_list) <= 1:
+            return {fetch: self._query_stock_data_from_net(*fetch, interval) for fetch in params_list}
+
+        max_workers = min(self.MAX_NET_FETCH_WORKERS, len(params_list))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            query_dfs = executor.map(lambda fetch: self._query_stock_data_from_net(*fetch, interval), params_list)
+            return dict(zip(params_list, query_dfs))
+
     def _fetch_data_akshare(self, symbol: str, start_date: str, end_date: str, 
                            period: str) -> Union[pd.DataFrame, bool]:
         """
@@ -407,6 +699,7 @@ class DataFetcher:
         akshare_period = self.INTERVAL_TO_PERIOD_MAP[period]
         
         try:
+            import akshare as ak  # 导入耗时较长，只在使用akshare数据源时加载
             if symbol.endswith('.HK'):
                 query_df = ak.stock_hk_hist(
                     symbol=symbol, 
@@ -424,18 +717,9 @@ class DataFetcher:
                     adjust="qfq"
                 )
                 
-            # 字段兼容
-            query_df.rename(columns={
-                '日期': 'Date',
-                '开盘': 'Open',
-                '收盘': 'Close',
-                '最高': 'High',
-                '最低': 'Low',
-                '成交量': 'Volume',
-                '成交额': 'Turnover',
-            }, inplace=True)
-            
-            return query_df
+            # 字段兼容，只保留用到的列，振幅、涨跌幅等列不再随数据进入缓存
+            used_columns = [column for column in self.AKSHARE_COLUMN_MAP if column in query_df.columns]
+            return query_df[used_columns].rename(columns=self.AKSHARE_COLUMN_MAP)
             
         except Exception as e:
             self.logger.error(f"使用akshare获取{symbol}数据失败: {str(e)}")
@@ -457,14 +741,65 @@ class DataFetcher:
         """
         try:
             yf_symbol = self._convert_to_yfinance_symbol(symbol)
-            ticker = yf.Ticker(yf_symbol)
+            ticker = self._get_yf_ticker(yf_symbol)
             return ticker.history(start=start_date, end=end_date, interval=interval)
             
         except Exception as e:
             self.logger.error(f"使用yfinance获取{symbol}数据失败: {str(e)}")
             return False
             
-    def _convert_to_yfinance_symbol(self, symbol: str) -> str:
+    def _get_yf_ticker(self, yf_symbol: str) -> 'yf.Ticker':
+        """
+        复用同一只股票的Ticker对象，保留其已解析的时区等元数据，避免重复请求；
+        HTTP会话由yfinance内部的单例统一复用
+        """
+        ticker = self.yf_tickers.get(yf_symbol)
+        if ticker is None:
+            import yfinance as yf
+            ticker = self.yf_tickers.setdefault(yf_symbol, yf.Ticker(yf_symbol))
+        return ticker
+
+    def _fetch_data_yfinance_batch(self, symbols: List[str], start_date: str, end_date: str, 
+                                   interval: str) -> Dict[str, pd.DataFrame]:
+        """
+        使用yfinance多线程一次下载多只股票数据
+        
+        Args:
+            symbols (List[str]): 股票代码列表
+            start_date (str): 开始日期
+            end_date (str): 结束日期（不包含）
+            interval (str): 数据间隔
+            
+        Returns:
+            Dict[str, pd.DataFrame]: 股票代码 -> 查询结果，下载失败的股票不包含在内
+        """
+        yf_symbols = {self._convert_to_yfinance_symbol(symbol): symbol for symbol in symbols}
+        try:
+            import yfinance as yf  # 导入耗时较长，只在使用yfinance数据源时加载
+
+            # 与 Ticker.history 保持一致使用复权价格，避免库中新旧数据口径不同
+            batch_df = yf.download(list(yf_symbols), start=start_date, end=end_date, interval=interval,
+                                   group_by='ticker', threads=True, progress=False, auto_adjust=True)
+        except Exception as e:
+            self.logger.error(f"使用yfinance批量获取{symbols}数据失败: {str(e)}")
+            return {}
+
+        query_dfs: Dict[str, pd.DataFrame] = {}
+        for yf_symbol, symbol in yf_symbols.items():
+            if isinstance(batch_df.columns, pd.MultiIndex):
+                if yf_symbol not in batch_df.columns.get_level_values(0):
+                    self.logger.error(f"使用yfinance批量获取{symbol}数据失败: 结果中没有{yf_symbol}")
+                    continue
+                query_df = batch_df[yf_symbol]
+            else:
+                query_df = batch_df
+            # 多只股票按日期对齐，去掉该股票没有交易的日期
+            query_dfs[symbol] = query_df.dropna(how='all').copy()
+        return query_dfs
+
+    @staticmethod
+    @lru_cache(maxsize=16384)
+    def _convert_to_yfinance_symbol(symbol: str) -> str:
         """
         将股票代码转换为yfinance格式
         
@@ -482,25 +817,35 @@ class DataFetcher:
             return f"{symbol}.SZ"
 
     @staticmethod
+    @lru_cache(maxsize=4096)
+    def _parse_date(date_str: str) -> pd.Timestamp:
+        """解析日期字符串，Timestamp不可变，同一字符串只解析一次"""
+        return pd.Timestamp(date_str)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _get_next_day(date_str: str) -> str:
+        return str(DataFetcher._to_day(date_str) + np.timedelta64(1, 'D'))
+
+    @staticmethod
+    def _to_day(date_str: str) -> np.datetime64:
+        """日期字符串转为按天精度的datetime64，供numpy工作日函数使用"""
+        return DataFetcher._parse_date(date_str).to_datetime64().astype('datetime64[D]')
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
     def _is_workday(date_str: str) -> bool:
-        date = pd.to_datetime(date_str)
-        if date.weekday() >= 5:
-            return False
-        return True
+        return bool(np.is_busday(DataFetcher._to_day(date_str)))
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def _get_nearest_workday_backward(date_str: str) -> str:
-        date = pd.to_datetime(date_str)
-        while not DataFetcher._is_workday(date.strftime('%Y-%m-%d')):
-            date -= timedelta(days=1)
-        return date.strftime('%Y-%m-%d')
+        return str(np.busday_offset(DataFetcher._to_day(date_str), 0, roll='backward'))
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def _get_nearest_workday_forward(date_str: str) -> str:
-        date = pd.to_datetime(date_str)
-        while not DataFetcher._is_workday(date.strftime('%Y-%m-%d')):
-            date += timedelta(days=1)
-        return date.strftime('%Y-%m-%d')
+        return str(np.busday_offset(DataFetcher._to_day(date_str), 0, roll='forward'))
 
     def _adjust_date_range(self, adj_symbol: str, adj_start_date: str, adj_end_date: str, 
                            db_start_date: datetime, db_end_date: datetime) -> Tuple[str, str]:
@@ -517,13 +862,12 @@ class DataFetcher:
         Returns:
             tuple[str, str]: 调整后的开始日期和结束日期
         """
-        if db_start_date > pd.to_datetime(adj_end_date):
+        start, end = self._parse_date(adj_start_date), self._parse_date(adj_end_date)
+        # 请求区间在库中区间之前，或与库中区间左侧重叠：只取库中最早日期之前的部分
+        if end < db_start_date or start < db_start_date < end:
             adj_end_date = (db_start_date - timedelta(days=1)).strftime('%Y-%m-%d')
-        elif db_end_date < pd.to_datetime(adj_start_date):
-            adj_start_date = (db_end_date + timedelta(days=1)).strftime('%Y-%m-%d')
-        elif pd.to_datetime(adj_start_date) < db_start_date and db_start_date < pd.to_datetime(adj_end_date):
-            adj_end_date = (db_start_date - timedelta(days=1)).strftime('%Y-%m-%d')
-        elif pd.to_datetime(adj_start_date) < db_end_date and db_end_date < pd.to_datetime(adj_end_date):
+        # 请求区间在库中区间之后，或与库中区间右侧重叠：只取库中最晚日期之后的部分
+        elif db_end_date < start or start < db_end_date < end:
             adj_start_date = (db_end_date + timedelta(days=1)).strftime('%Y-%m-%d')
             
         return adj_start_date, adj_end_date
@@ -539,10 +883,15 @@ class DataFetcher:
         Returns:
             bool: 是否需要更新数据
         """
-        need_update_data = False
-        if not db_df.empty:
-            for index, row in db_df.iterrows():
-                if row['Timestamp'] and pd.to_datetime(row['Timestamp']) < pd.to_datetime(f"{index} 16:15:00"): # 入库时间戳较收盘时间早，标记需要特殊处理，考虑港股要取16:15:00
-                    self.logger.info(f"[CHECK]股票{adj_symbol}数据库中存在{index}的盘中数据，入库时间戳为{row['Timestamp']}，较收盘时间早，标记需要特殊处理")
-                    need_update_data = True
-        return need_update_data
\ No newline at end of file
+        if db_df.empty:
+            return False
+        # 入库时间戳较收盘时间早，标记需要特殊处理，考虑港股要取16:15:00
+        # 入库时间戳统一按'%Y-%m-%d %H:%M:%S'写入，指定格式跳过逐个元素的格式推断
+        timestamps = pd.to_datetime(db_df['Timestamp'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
+        close_times = db_df.index.normalize() + pd.Timedelta(hours=16, minutes=15)
+        stale_mask = timestamps.to_numpy() < close_times.to_numpy()
+        if not stale_mask.any():
+            return False
+        stale_dates = db_df.index[stale_mask].strftime('%Y-%m-%d').tolist()
+        self.logger.info(f"[CHECK]股票{adj_symbol}数据库中存在{len(stale_dates)}条盘中数据{stale_dates}，入库时间戳较收盘时间早，标记需要特殊处理")
+        return True
\ No newline at end of file
@@ -1,4 +1,5 @@
 import sqlite3
+import numpy as np
 import pandas as pd
 import threading
 import logging
@@ -26,31 +27,68 @@ class TableSchema:
 
 class DataConverter:
     """数据转换工具类"""
+    VALUE_COLUMNS = ["Open", "High", "Low", "Close", "Volume", "Turnover"]
+
     @staticmethod
     def df_to_db_records(symbol: str, df: pd.DataFrame, interval: str) -> List[Tuple]:
         """将DataFrame转换为数据库记录格式"""
-        return [
-            (symbol, idx.strftime('%Y-%m-%d'), row.Open, row.High, row.Low,
-             row.Close, row.Volume, row.Turnover, interval, row.Timestamp)
-            for idx, row in df.iterrows()
-        ]
+        n = len(df)
+        timestamps = df['Timestamp']
+        if pd.api.types.is_datetime64_any_dtype(timestamps):
+            timestamps = timestamps.dt.strftime('%Y-%m-%d %H:%M:%S')
+        return list(zip(
+            [symbol] * n, df.index.strftime('%Y-%m-%d'),
+            df['Open'].tolist(), df['High'].tolist(), df['Low'].tolist(),
+            df['Close'].tolist(), df['Volume'].tolist(), df['Turnover'].tolist(),
+            [interval] * n, timestamps.tolist()
+        ))
     
     @staticmethod
     def db_rows_to_df(rows: List[Tuple]) -> pd.DataFrame:
-        """将数据库查询结果转换为DataFrame"""
-        df = pd.DataFrame(rows, columns=["Date", "Open", "High", "Low", "Close", "Volume", "Turnover", "Timestamp"])
-        df["Date"] = pd.to_datetime(df["Date"])
-        df.set_index("Date", inplace=True)
-        return df
+        """将数据库查询结果转换为DataFrame，先按列转置再构造，避免逐行推断类型"""
+        if not rows:
+            df = pd.DataFrame(rows, columns=["Date"] + DataConverter.VALUE_COLUMNS + ["Timestamp"])
+            df["Date"] = pd.to_datetime(df["Date"])
+            df.set_index("Date", inplace=True)
+            return df
+        dates, *values, timestamps = zip(*rows)
+        data = {column: np.array(column_values, dtype=np.float64)
+                for column, column_values in zip(DataConverter.VALUE_COLUMNS, values)}
+        data["Timestamp"] = list(timestamps)
+        try:
+            # 库中日期按'%Y-%m-%d'写入，固定格式解析最快
+            parsed = pd.to_datetime(dates, format="%Y-%m-%d")
+        except ValueError:
+            # 带时间部分等其他格式的日期退回自动推断
+            parsed = pd.to_datetime(pd.Series(dates))
+        index = pd.DatetimeIndex(parsed, name="Date")
+        return pd.DataFrame(data, index=index)
 
 class DataBase:
+    # 单条SQL的IN子句参数个数上限，低于SQLite默认的999个变量限制并给日期参数留出余量
+    MAX_IN_PARAMS = 900
+    # WAL模式下读写互不阻塞，批量回测的多个进程可以同时读库；其余参数放宽同步并加大页缓存和内存映射
+    CONNECTION_PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA mmap_size=1073741824",
+        "PRAGMA cache_size=-262144",
+    )
+
     def __init__(self, db_path: str):
         self.db_path = db_path
         self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.lock = threading.Lock()
         self.logger = logging.getLogger(__name__)
+        self._configure_connection()
         self._create_tables()
 
+    def _configure_connection(self) -> None:
+        """设置连接级别的PRAGMA"""
+        for pragma in self.CONNECTION_PRAGMAS:
+            self.conn.execute(pragma)
+
     def _create_tables(self) -> None:
         """创建必要的数据库表"""
         with self.lock:
@@ -96,8 +134,8 @@ class DataBase:
             self.conn.commit()
 
     def _log_data_operation(self, operation: str, df: pd.DataFrame) -> None:
-        """记录数据操作日志"""
-        if not df.empty:
+        """记录数据操作日志，DEBUG级别关闭时跳过首末行转字典的开销"""
+        if not df.empty and self.logger.isEnabledFor(logging.DEBUG):
             self.logger.debug(f"DB {operation}数据第1条: Date: {df.index[0]} {df.iloc[0].to_dict()}")
             self.logger.debug(f"DB {operation}数据最后1条: Date: {df.index[-1]} {df.iloc[-1].to_dict()}")
 
@@ -121,6 +159,36 @@ class DataBase:
             self._log_data_operation("fetch", df)
             return df
 
+    def fetch_many(self, symbols: List[str], start_date: str, end_date: str, interval: str) -> Dict[str, pd.DataFrame]:
+        """批量获取多只股票的历史数据，IN子句分块查询，结果按股票分组"""
+        rows_by_symbol: Dict[str, List[Tuple]] = {}
+        with self.lock:
+            table_name = TableSchema.get_hist_data_table(interval)
+            for chunk in self._chunk_symbols(symbols):
+                sql = f'''SELECT symbol, date, open, high, low, close, volume, turnover, timestamp 
+                         FROM {table_name}
+                         WHERE symbol IN ({','.join('?' * len(chunk))}) AND date>=? AND date<=? 
+                         ORDER BY symbol, date ASC'''
+                for row in self.conn.execute(sql, (*chunk, start_date, end_date)):
+                    rows_by_symbol.setdefault(row[0], []).append(row[1:])
+        return {symbol: DataConverter.db_rows_to_df(rows) for symbol, rows in rows_by_symbol.items()}
+
+    def get_date_bounds_many(self, symbols: List[str], interval: str) -> Dict[str, Tuple[str, str]]:
+        """批量获取多只股票第一条和最后一条数据的日期，库中没有数据的股票不包含在结果中"""
+        bounds: Dict[str, Tuple[str, str]] = {}
+        with self.lock:
+            table_name = TableSchema.get_hist_data_table(interval)
+            for chunk in self._chunk_symbols(symbols):
+                sql = f'''SELECT symbol, MIN(date), MAX(date) FROM {table_name}
+                         WHERE symbol IN ({','.join('?' * len(chunk))}) GROUP BY symbol'''
+                for symbol, first_date, last_date in self.conn.execute(sql, chunk):
+                    bounds[symbol] = (first_date, last_date)
+        return bounds
+
+    def _chunk_symbols(self, symbols: List[str]) -> List[List[str]]:
+        """按IN子句参数上限把股票列表切块"""
+        return [symbols[i:i + self.MAX_IN_PARAMS] for i in range(0, len(symbols), self.MAX_IN_PARAMS)]
+
     def insert(self, symbol: str, df: pd.DataFrame, interval: str) -> None:
         """插入历史数据"""
         if df.empty:
@@ -138,6 +206,32 @@ class DataBase:
             self.conn.executemany(sql, data)
             self.conn.commit()
 
+    def write_many(self, items: List[Tuple[str, pd.DataFrame, bool]], interval: str) -> None:
+        """在同一个事务中写入多只股票的历史数据，items为(symbol, df, update)，update为True时覆盖已有记录"""
+        table_name = TableSchema.get_hist_data_table(interval)
+        # 先在锁外把所有股票的记录按写入方式合并，事务内每种方式只执行一次executemany
+        records: Dict[str, List[Tuple]] = {"IGNORE": [], "REPLACE": []}
+        for symbol, df, update in items:
+            if df.empty:
+                self.logger.warning(f"插入数据为空: symbol={symbol}, interval={interval}")
+                continue
+            self._log_data_operation("update" if update else "insert", df)
+            records["REPLACE" if update else "IGNORE"].extend(DataConverter.df_to_db_records(symbol, df, interval))
+
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for action, data in records.items():
+                    if data:
+                        sql = f'''INSERT OR {action} INTO {table_name}
+                                 (symbol, date, open, high, low, close, volume, turnover, interval, timestamp)
+                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+                        self.conn.executemany(sql, data)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
     def update(self, symbol: str, df: pd.DataFrame, interval: str) -> None:
         """更新历史数据"""
         with self.lock:
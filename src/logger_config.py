@@ -1,4 +1,5 @@
 import logging
+import logging.handlers
 import os
 from datetime import datetime
 from typing import Optional
@@ -50,13 +51,14 @@ def setup_console_handler(formatter: logging.Formatter) -> logging.StreamHandler
 
 def clear_existing_handlers(logger: logging.Logger) -> None:
     """
-    清除日志记录器现有的所有处理器
+    清除并关闭日志记录器现有的所有处理器，避免重复配置时遗留打开的日志文件
     
     Args:
         logger (logging.Logger): 要清理的日志记录器
     """
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
+        handler.close()
 
 def setup_logger(enable_console: bool = True) -> logging.Logger:
     """
@@ -84,4 +86,34 @@ def setup_logger(enable_console: bool = True) -> logging.Logger:
     if enable_console:
         logger.addHandler(setup_console_handler(formatter))
     
-    return logger 
+    return logger
+
+def setup_queue_logger(log_queue) -> logging.Logger:
+    """
+    配置子进程的根日志记录器，日志记录只放入队列，由主进程统一输出
+    
+    Args:
+        log_queue: 跨进程共享的日志队列
+    
+    Returns:
+        logging.Logger: 配置好的根日志记录器
+    """
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+    clear_existing_handlers(logger)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    return logger
+
+def start_queue_listener(log_queue) -> logging.handlers.QueueListener:
+    """
+    在主进程中启动日志队列监听，用当前根日志记录器的处理器输出子进程日志
+    
+    Args:
+        log_queue: 跨进程共享的日志队列
+    
+    Returns:
+        logging.handlers.QueueListener: 已启动的监听器，使用完毕后需调用 stop()
+    """
+    listener = logging.handlers.QueueListener(log_queue, *logging.getLogger().handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -32,7 +32,7 @@ def parse_arguments():
     parser.add_argument('--optimize', action='store_true', help='是否进行参数优化')
     parser.add_argument('--max_iterations', type=int, default=None, help='最大优化迭代次数')
     parser.add_argument('--brick_size', type=float, default=None, help='砖块颗粒度')
-    parser.add_argument('--threads', type=int, default=None, help='每个进程的多线程数量')
+    parser.add_argument('--threads', type=int, default=None, help='参数优化时每只股票使用的工作进程数量')
     parser.add_argument('--workers', type=int, default=1, help='多进程数量，默认1')
     parser.add_argument('--save_data', action='store_true', help='是否保存中间Renko、portfolio等中间数据文件，默认不保存')
     parser.add_argument('--symbol_list', default=None, help='股票代码列表配置文件（JSON数组），如config/symbol_list.json')
@@ -94,8 +94,21 @@ def run_single_backtest(symbol, symbol_name, args):
         logger.error(f"处理股票 {symbol} {symbol_name} 时发生错误: {str(e)}", exc_info=True)
         raise
 
+def prepare_batch_data(symbol_list, args):
+    """批量准备数据库数据：一次查询全部股票的库中数据，缺失部分合并请求网络，子进程随后直接读库"""
+    try:
+        config = RenkoConfig()
+        data_fetcher = DataFetcher(use_db_cache=config.use_db_cache, use_csv_cache=config.use_csv_cache, 
+                                   query_method=config.query_method)
+        data_fetcher.prepare_db_data_batch(symbol_list, args.start_date, args.end_date)
+    except Exception as e:
+        logger.error(f"批量准备数据失败，由各子进程逐只准备: {str(e)}", exc_info=True)
+
 def run_batch_backtest(symbol_list, symbol_name_map, args):
     """批量回测流程"""
+    symbol_list = [symbol for symbol in symbol_list if not check_result_file(symbol, args)]
+    if symbol_list:
+        prepare_batch_data(symbol_list, args)
     max_workers = args.workers
     logger.info(f"使用 {max_workers} 个进程进行处理")
     with ProcessPoolExecutor(max_workers=max_workers) as executor:
@@ -112,8 +125,7 @@ def resolve_symbol_list(symbol_list):
 
     # 删除ST股票
     new_symbol_list = [symbol for symbol in symbol_list 
-                       if not data_fetcher.get_symbol_name(symbol).startswith('ST') and 
-                       not data_fetcher.get_symbol_name(symbol).startswith('*ST')]
+                       if not data_fetcher.get_symbol_name(symbol).startswith(('ST', '*ST'))]
     logger.info(f"删除ST股票后剩余 {len(symbol_list)} 个股票代码")
 
     return new_symbol_list, symbol_name_map
@@ -21,7 +21,9 @@ class RenkoBacktester:
         self.logger = logging.getLogger(__name__)
 
     def run_backtest(self):
-        """运行回测主流程"""
+        """运行回测主流程，已有回测结果时直接返回，避免重复获取数据和生成砖型图"""
+        if self.result is not None:
+            return self.result
         try:
             df = self._fetch_data()
             if df is None:
@@ -51,7 +53,7 @@ class RenkoBacktester:
         """运行参数优化回测"""
         self.optimizer = BacktestOptimizer(df, self.args)
         self.optimizer.run_optimization()
-        best_result = self.optimizer.get_best_result()
+        best_result = self.optimizer.replay_best()
         best_result['symbol_name'] = self.symbol_name
         return best_result
 
@@ -158,7 +160,7 @@ class RenkoBacktester:
 
     def plot_results(self):
         """绘制回测结果"""
-        if self.result is None or self.result['renko_data'].empty:
+        if self.result is None or self.result.get('renko_data') is None or self.result['renko_data'].empty:
             self.logger.error("回测结果为空，请先运行回测试")
             return
         self.plotter.set_data(self.result)
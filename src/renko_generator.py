@@ -1,7 +1,69 @@
 import pandas as pd
 import numpy as np
-from typing import Literal, Optional
+from typing import Dict, Literal, Optional
 import logging
+from numba import njit
+
+
+@njit(cache=True)
+def _grow(arr, capacity):
+    out = np.empty(capacity, dtype=arr.dtype)
+    out[:len(arr)] = arr
+    return out
+
+
+@njit(cache=True)
+def _build_renko(closes, brick_size):
+    """
+    ATR模式砖块构建内核（Numba JIT）
+
+    Args:
+        closes (np.ndarray): float64收盘价序列
+        brick_size (float): 砖块大小
+
+    Returns:
+        tuple: (rows, opens, prices, directions, indices)，依次为砖块对应的K线位置、
+               开盘价、收盘价、方向以及砖块序号
+    """
+    capacity = len(closes) + 1
+    rows = np.empty(capacity, dtype=np.int64)
+    opens = np.empty(capacity, dtype=np.float64)
+    prices = np.empty(capacity, dtype=np.float64)
+    directions = np.empty(capacity, dtype=np.int64)
+    indices = np.empty(capacity, dtype=np.int64)
+    n = 0
+    index = 0
+    current_price = closes[0]
+    for i in range(1, len(closes)):
+        price_change = closes[i] - current_price
+        num_bricks = abs(int(price_change / brick_size))
+        if num_bricks == 0:
+            continue
+        direction = 1 if price_change > 0 else -1
+        # 按本根K线跨越的砖块数一次性预留空间，内层循环无需再做容量检查
+        if n + num_bricks > capacity:
+            capacity = max(capacity * 2, n + num_bricks)
+            rows = _grow(rows, capacity)
+            opens = _grow(opens, capacity)
+            prices = _grow(prices, capacity)
+            directions = _grow(directions, capacity)
+            indices = _grow(indices, capacity)
+        for _ in range(num_bricks):
+            open_price = current_price
+            close_price = current_price + direction * brick_size
+            # 合并横盘砖块
+            if n > 0 and (close_price == opens[n - 1] or close_price == prices[n - 1]):
+                n -= 1
+            rows[n] = i
+            opens[n] = open_price
+            prices[n] = close_price
+            directions[n] = direction
+            indices[n] = index
+            n += 1
+            current_price = close_price
+            index += 1
+    return rows[:n], opens[:n], prices[:n], directions[:n], indices[:n]
+
 
 class RenkoGenerator:
     def __init__(self, mode: Literal['daily', 'atr'] = 'atr', atr_period: int = 10, 
@@ -48,11 +110,46 @@ class RenkoGenerator:
         Returns:
             pd.DataFrame: 砖型图数据
         """
+        return self.generate_renko_from_arrays(self.prepare_arrays(data))
+
+    @staticmethod
+    def prepare_arrays(data: pd.DataFrame) -> Dict[str, object]:
+        """
+        从K线数据中一次性提取生成砖型图所需的数组，参数扫描时可在多组参数间复用
+        
+        Args:
+            data (pd.DataFrame): 原始K线数据
+            
+        Returns:
+            Dict: dates为日期索引，close为float64收盘价，true_range为逐日真实波幅
+        """
+        high = data['High'].to_numpy(np.float64)
+        low = data['Low'].to_numpy(np.float64)
+        closes = data['Close'].to_numpy(np.float64)
+        prev_close = np.empty_like(closes)
+        prev_close[0] = np.nan
+        prev_close[1:] = closes[:-1]
+        # 首行前收盘价为NaN，fmax忽略NaN，与pandas按行max(skipna)的结果一致
+        true_range = np.fmax.reduce([high - low, np.abs(high - prev_close), np.abs(low - prev_close)])
+        return {'dates': data.index, 'close': closes, 'true_range': true_range}
+
+    def generate_renko_from_arrays(self, arrays: Dict[str, object]) -> pd.DataFrame:
+        """
+        由 prepare_arrays 提取的数组生成砖型图数据
+        
+        Args:
+            arrays (Dict): prepare_arrays 的返回值
+            
+        Returns:
+            pd.DataFrame: 砖型图数据
+        """
+        dates = arrays['dates']
+        closes = arrays['close']
         if self.mode == 'daily':
-            self.renko_data = self._generate_renko(data, self._daily_brick_logic)
+            self.renko_data = self._generate_daily_renko(dates, closes)
         else:
             if self.brick_size is None:
-                self.brick_size = self._calculate_atr(data)
+                self.brick_size = self._calculate_atr(arrays['true_range'])
                 if self.brick_size == 0:
                     self.logger.warning("ATR计算的砖块大小为0")
                     self.renko_data = pd.DataFrame()
@@ -60,76 +157,70 @@ class RenkoGenerator:
                 self.logger.info(f"ATR计算的砖块大小为: {self.brick_size:.2f}")
             else:
                 self.logger.info(f"使用用户设置的砖块大小: {self.brick_size:.2f}")
-            self.renko_data = self._generate_renko(data, self._atr_brick_logic)
+            self.renko_data = self._generate_atr_renko(dates, closes)
             if self.save_data:
                 self._save_data()
         return self.renko_data
 
-    def _generate_renko(self, data: pd.DataFrame, brick_logic_func) -> pd.DataFrame:
+    def _generate_daily_renko(self, dates: pd.Index, closes: np.ndarray) -> pd.DataFrame:
         """
-        通用砖型图生成主流程
+        日K线模式砖型图生成：收盘价相对前一日上涨或下跌即生成一块砖，平盘不生成
         """
-        renko_data = []
-        current_price = data['Close'].iloc[0]
-        index = 0
-        for i in range(1, len(data)):
-            current_price, index = brick_logic_func(data, i, current_price, index, renko_data)
+        prev_closes = closes[:-1]
+        cur_closes = closes[1:]
+        price_change = cur_closes - prev_closes
+        moved = (price_change > 0) | (price_change < 0)
+        if not moved.any():
+            return pd.DataFrame()
+        opens = prev_closes[moved]
+        prices = cur_closes[moved]
+        return pd.DataFrame({
+            'index': np.arange(len(prices)),
+            'date': dates[1:][moved],
+            'open': opens,
+            'high': np.maximum(opens, prices),
+            'low': np.minimum(opens, prices),
+            'close': prices,
+            'trend': np.where(price_change[moved] > 0, 1, -1)
+        })
 
-        # ATR模式下补最后一块不完整砖
-        if brick_logic_func == self._atr_brick_logic and renko_data:
-            self._append_incomplete_brick(data, renko_data, index)
-        return pd.DataFrame(renko_data)
-
-    def _daily_brick_logic(self, data: pd.DataFrame, i: int, current_price: float, index: int, renko_data: list):
+    def _generate_atr_renko(self, dates: pd.Index, closes: np.ndarray) -> pd.DataFrame:
         """
-        日K线模式下的砖块生成逻辑
+        ATR模式砖型图生成，砖块构建由JIT内核完成，结果一次性组装为DataFrame
         """
-        price = data['Close'].iloc[i]
-        price_change = price - current_price
-        if price_change > 0:
-            renko_data.append(self._make_brick(index, data.index[i], current_price, price, current_price, price, 1))
-            index += 1
-        elif price_change < 0:
-            renko_data.append(self._make_brick(index, data.index[i], current_price, current_price, price, price, -1))
-            index += 1
-        return price, index
-
-    def _atr_brick_logic(self, data: pd.DataFrame, i: int, current_price: float, index: int, renko_data: list):
-        """
-        ATR模式下的砖块生成逻辑
-        """
-        price = data['Close'].iloc[i]
-        price_change = price - current_price
-        num_bricks = abs(int(price_change / self.brick_size))
-        if num_bricks > 0:
-            direction = 1 if price_change > 0 else -1
-            for _ in range(num_bricks):
-                open_price = current_price
-                close_price = current_price + direction * self.brick_size
-                # 合并横盘砖块
-                if renko_data and (close_price == renko_data[-1]['open'] or close_price == renko_data[-1]['close']):
-                    renko_data.pop()
-                renko_data.append(self._make_brick(index, data.index[i], open_price, max(open_price, close_price), min(open_price, close_price), close_price, direction))
-                current_price = close_price
-                index += 1
-        return current_price, index
-
-    def _append_incomplete_brick(self, data: pd.DataFrame, renko_data: list, index: int):
+        rows, opens, prices, directions, indices = _build_renko(closes, float(self.brick_size))
+        if len(rows) == 0:
+            return pd.DataFrame()
+        renko_data = pd.DataFrame({
+            'index': indices,
+            'date': dates[rows],
+            'open': opens,
+            'high': np.maximum(opens, prices),
+            'low': np.minimum(opens, prices),
+            'close': prices,
+            'trend': directions
+        })
+        # 补最后一块不完整砖
+        return self._append_incomplete_brick(dates, closes, renko_data, indices[-1] + 1)
+
+    def _append_incomplete_brick(self, dates: pd.Index, closes: np.ndarray, renko_data: pd.DataFrame, index: int) -> pd.DataFrame:
         """
         补充最后一块不完整砖（ATR模式专用）
         """
-        last_brick_price = renko_data[-1]['close']
-        last_k_price = data['Close'].iloc[-1]
+        last_brick_price = renko_data['close'].iloc[-1]
+        last_k_price = closes[-1]
 
         if last_brick_price != last_k_price:
-            last_k_date = data.index[-1]
-            renko_data.append(self._make_brick(
+            last_k_date = dates[-1]
+            incomplete = self._make_brick(
                 index, last_k_date, last_brick_price,
                 max(last_brick_price, last_k_price),
                 min(last_brick_price, last_k_price),
                 last_k_price, 
                 0       # 最后一块不完整块，趋势设置为0，不参与回测试
-            ))
+            )
+            renko_data.loc[len(renko_data)] = incomplete
+        return renko_data
 
     def _make_brick(self, index, date, open_, high, low, close, trend):
         """
@@ -145,26 +236,18 @@ class RenkoGenerator:
             'trend': trend
         }
 
-    def _calculate_atr(self, data: pd.DataFrame) -> float:
+    def _calculate_atr(self, true_range: np.ndarray) -> float:
         """
-        计算ATR值
+        计算ATR值（Wilder平滑）
         
         Args:
-            data (pd.DataFrame): 原始K线数据
+            true_range (np.ndarray): 逐日真实波幅
             
         Returns:
             float: ATR值
         """
-        high = data['High']
-        low = data['Low']
-        close = data['Close']
-        
-        tr1 = high - low
-        tr2 = abs(high - close.shift())
-        tr3 = abs(low - close.shift())
-        
-        tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-        atr = tr.rolling(self.atr_period).mean().iloc[-1]
+        # Wilder平滑：alpha=1/N 的指数移动平均
+        atr = pd.Series(true_range).ewm(alpha=1 / self.atr_period, adjust=False).mean().iloc[-1]
         
         return atr * self.atr_multiplier
         
@@ -6,6 +6,7 @@ import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import mplfinance as mpf
 import os
+import numpy as np
 import pandas as pd
 import threading
 from typing import Optional, Dict, Any
@@ -158,22 +159,22 @@ class RenkoPlotter:
         绘制投资组合价值曲线。
         """
         ax.set_title('Portfolio Value', fontsize=10)
-        ax.plot(self.portfolio_value.index, self.portfolio_value['total'], 'b-')
-        max_idx = self.portfolio_value['total'].idxmax()
-        last_idx = self.portfolio_value.index[-1]
+        total = self.portfolio_value['total'].to_numpy()
+        ax.plot(self.portfolio_value.index, total, 'b-')
+        max_idx = int(np.argmax(total))
+        last_idx = len(total) - 1
         if max_idx != last_idx:
-            self._annotate_portfolio_point(ax, max_idx, 'Max', 'yellow')
-        self._annotate_portfolio_point(ax, last_idx, 'Final', 'lightblue')
+            self._annotate_portfolio_point(ax, total, max_idx, 'Max', 'yellow')
+        self._annotate_portfolio_point(ax, total, last_idx, 'Final', 'lightblue')
         ax.set_xlabel('Index')
         ax.grid(True)
 
-    def _annotate_portfolio_point(self, ax, idx, label, color):
+    def _annotate_portfolio_point(self, ax, total, idx, label, color):
         """
         标注投资组合关键点。
         """
-        value = self.portfolio_value.iloc[idx]['total']
-        initial_value = self.portfolio_value['total'].iloc[0]
-        ratio = (value / initial_value - 1) * 100
+        value = total[idx]
+        ratio = (value / total[0] - 1) * 100
         ax.annotate(f'{label}: {ratio:+.1f}%',
                     xy=(idx, value),
                     xytext=(0, 10),
@@ -207,19 +208,16 @@ class RenkoPlotter:
         ratio = (value / initial_value - 1) * 100
         
         if ratio > self.target_return:
-            # 获取最近N天的日期范围
-            last_date = pd.to_datetime(self.signals['date'].iloc[-1])  # 使用 iloc 而不是 [-1]
-            start_date = last_date - pd.Timedelta(days=self.recent_signal_days)
-            
-            # 筛选最近N天内的信号
-            recent_signals = self.signals[
-                (pd.to_datetime(self.signals['date']) >= start_date) & 
-                (pd.to_datetime(self.signals['date']) <= last_date)
-            ]
-                        
-            for _, signal in recent_signals.iterrows():
-                if signal['signal'] != 0:
-                    return "Buy" if signal['signal'] == 1 else "Sell"
+            # 获取最近N天的日期范围，砖块日期升序排列，直接二分定位起点
+            dates = pd.to_datetime(self.signals['date']).to_numpy()
+            start_date = dates[-1] - np.timedelta64(self.recent_signal_days, 'D')
+            start_pos = np.searchsorted(dates, start_date, side='left')
+
+            # 最近N天内的第一个非零信号
+            recent_signals = self.signals['signal'].to_numpy()[start_pos:]
+            nonzero = np.flatnonzero(recent_signals)
+            if nonzero.size:
+                return "Buy" if recent_signals[nonzero[0]] == 1 else "Sell"
         return "NA"
 
     def _log_result(self, file_name: str):
@@ -237,5 +235,4 @@ class RenkoPlotter:
         """
         确保目录存在。
         """
-        if not os.path.exists(path):
-            os.makedirs(path)
\ No newline at end of file
+        os.makedirs(path, exist_ok=True)
\ No newline at end of file
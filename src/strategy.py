@@ -1,6 +1,84 @@
 import pandas as pd
 import numpy as np
 import logging
+from numba import njit, prange
+
+
+@njit(cache=True)
+def _scan_signals(buy_candidates, sell_candidates, start):
+    """
+    仓位状态机扫描：空仓时满足买入条件发出买入信号，持仓时满足卖出条件发出卖出信号
+    """
+    signal = np.zeros(len(buy_candidates), dtype=np.int64)
+    position = 0
+    for i in range(start, len(buy_candidates)):
+        if buy_candidates[i] and position == 0:
+            signal[i] = 1
+            position = 1
+        elif sell_candidates[i] and position == 1:
+            signal[i] = -1
+            position = 0
+    return signal
+
+
+@njit(parallel=True, cache=True)
+def _eval_grid(close, trend, buy_lens, sell_lens, initial_capital, lot_size, commission_buy, commission_sell):
+    """
+    一次遍历评估全部(买入趋势长度, 卖出趋势长度)组合，与 calculate_signals + backtest 的结果一致，各组合并行计算
+
+    Returns:
+        (np.ndarray, np.ndarray): 各组合的最终收益率、最后一块砖上的信号
+    """
+    n = len(close)
+    csum = np.zeros(n + 1)
+    for i in range(n):
+        csum[i + 1] = csum[i] + trend[i]
+    returns = np.empty(len(buy_lens))
+    last_signals = np.zeros(len(buy_lens), dtype=np.int64)
+    for k in prange(len(buy_lens)):
+        window = max(buy_lens[k], sell_lens[k])
+        rolling = np.full(n, np.nan)
+        for i in range(window - 1, n):
+            rolling[i] = csum[i + 1] - csum[i + 1 - window]
+        signal = _scan_signals(rolling >= buy_lens[k], rolling <= -sell_lens[k], window)
+        _, shares, cash = _settle_trades(close, signal, initial_capital, lot_size, commission_buy, commission_sell)
+        returns[k] = (shares[n - 1] * close[n - 1] + cash[n - 1] - initial_capital) / initial_capital
+        last_signals[k] = signal[n - 1]
+    return returns, last_signals
+
+
+@njit(cache=True)
+def _settle_trades(close, signal, initial_capital, lot_size, commission_buy, commission_sell):
+    """
+    按信号逐砖结算仓位：买入时按整手全仓买入，卖出时清仓，首块砖上的信号不执行；
+    收盘价非正的砖无法计算可买手数，跳过该买入信号
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): 每块砖收盘后的仓位、持股数、现金
+    """
+    n = len(close)
+    position = np.zeros(n, dtype=np.int64)
+    shares = np.zeros(n)
+    cash = np.empty(n)
+    cash[0] = initial_capital
+    for i in range(1, n):
+        position[i] = position[i - 1]
+        shares[i] = shares[i - 1]
+        cash[i] = cash[i - 1]
+        if signal[i] == 1 and position[i] == 0:
+            if close[i] <= 0:
+                continue
+            shares[i] = (cash[i] // (close[i] * lot_size)) * lot_size
+            trade_amount = shares[i] * close[i]
+            cash[i] -= trade_amount + trade_amount * commission_buy
+            position[i] = 1
+        elif signal[i] == -1 and position[i] == 1:
+            sell_amount = shares[i] * close[i]
+            cash[i] += sell_amount - sell_amount * commission_sell
+            shares[i] = 0.0
+            position[i] = 0
+    return position, shares, cash
+
 
 class RenkoStrategy:
     COMMISSION_BUY = 0.00009
@@ -24,12 +102,13 @@ class RenkoStrategy:
         self.logger = logging.getLogger(__name__)
         self.logger.info(f"策略初始化完成 - 股票代码: {symbol}, 买入趋势长度: {buy_trend_length}, 卖出趋势长度: {sell_trend_length}")
         
-    def calculate_signals(self, renko_data):
+    def calculate_signals(self, renko_data, trend=None):
         """
         计算交易信号
         
         Args:
             renko_data (pd.DataFrame): 砖型图数据
+            trend (np.ndarray, optional): 预先计算的趋势滚动和，参数扫描时可复用，默认现算
             
         Returns:
             pd.DataFrame: 包含交易信号的数据框
@@ -38,37 +117,28 @@ class RenkoStrategy:
         signals = pd.DataFrame(index=renko_data.index)
         signals['index'] = renko_data['index']
         signals['date'] = renko_data['date']
-        signals['signal'] = 0
-        
-        trend = self._calculate_trend(renko_data)
-        position = 0
-        for i in range(max(self.buy_trend_length, self.sell_trend_length), len(renko_data)):
-            current_trend = trend[i]
-            current_price = renko_data.iloc[i]['close']
-            date_str = renko_data.iloc[i]['date'].strftime('%Y-%m-%d')
-            if self._is_buy_signal(current_trend, position):
-                signals.loc[signals.index[i], 'signal'] = 1
-                position = 1
-                self.logger.info(f"生成买入信号 - 日期: {date_str}, 价格: {current_price:.2f}, 趋势值: {current_trend:.2f}")
-            elif self._is_sell_signal(current_trend, position):
-                signals.loc[signals.index[i], 'signal'] = -1
-                position = 0
-                self.logger.info(f"生成卖出信号 - 日期: {date_str}, 价格: {current_price:.2f}, 趋势值: {current_trend:.2f}")
-            else:
-                signals.loc[signals.index[i], 'signal'] = 0
-        
+
+        if trend is None:
+            trend = self._calculate_trend(renko_data).to_numpy()
+        buy_candidates = trend >= self.buy_trend_length
+        sell_candidates = trend <= -self.sell_trend_length
+        start = max(self.buy_trend_length, self.sell_trend_length)
+        signal = _scan_signals(buy_candidates, sell_candidates, start)
+        signals['signal'] = signal
+
+        close = renko_data['close'].to_numpy()
+        dates = renko_data['date']
+        for i in np.flatnonzero(signal):
+            date_str = dates.iloc[i].strftime('%Y-%m-%d')
+            action = "买入" if signal[i] == 1 else "卖出"
+            self.logger.info(f"生成{action}信号 - 日期: {date_str}, 价格: {close[i]:.2f}, 趋势值: {trend[i]:.2f}")
+
         return signals
         
     def _calculate_trend(self, renko_data):
         window = max(self.buy_trend_length, self.sell_trend_length)
         return renko_data['trend'].rolling(window).sum()
 
-    def _is_buy_signal(self, trend_value, position):
-        return trend_value >= self.buy_trend_length and position == 0
-
-    def _is_sell_signal(self, trend_value, position):
-        return trend_value <= -self.sell_trend_length and position == 1
-
     def backtest(self, renko_data, signals, initial_capital=1000000):
         """
         回测策略
@@ -82,25 +152,16 @@ class RenkoStrategy:
             pd.DataFrame: 回测结果
         """
         self.logger.info(f"开始回测 - 初始资金: {initial_capital:,.2f}")
-        portfolio = self._init_portfolio(renko_data, initial_capital)
-        buyin_cost = 0
+        close = renko_data['close'].to_numpy(np.float64)
+        signal = signals['signal'].to_numpy()
+        dates = renko_data['date']
+        self.logger.info(f"初始化完成 - 日期: {dates.iloc[0].strftime('%Y-%m-%d')}, 现金: {initial_capital:,.2f}, 总资产: {initial_capital:,.2f}")
 
-        for i in range(1, len(renko_data)):
-            current_idx = portfolio.index[i]
-            prev_idx = portfolio.index[i-1]
-            self._copy_prev_state(portfolio, current_idx, prev_idx)
-            current_price = renko_data.loc[current_idx, 'close']
-            signal = signals.loc[current_idx, 'signal']
-            position = portfolio.loc[prev_idx, 'position']
-
-            if signal == 1 and position == 0:
-                buyin_cost = self._execute_buy(portfolio, current_idx, current_price)
-            elif signal == -1 and position == 1:
-                self._execute_sell(portfolio, current_idx, current_price, buyin_cost)
-            if portfolio.loc[current_idx, 'position'] == 1:
-                self._update_holdings(portfolio, current_idx, current_price)
-            self._update_total(portfolio, current_idx)
+        position, shares, cash = _settle_trades(close, signal, float(initial_capital),
+                                                self.LOT_SIZE, self.COMMISSION_BUY, self.COMMISSION_SELL)
+        self._log_trades(dates, close, position, shares, cash)
 
+        portfolio = self._build_portfolio(renko_data, position, shares, cash)
         final_return = (portfolio.iloc[-1]['total'] - initial_capital) / initial_capital
         self.logger.info(f"回测完成 - 最终总资产: {portfolio.iloc[-1]['total']:,.2f}, 总收益率: {final_return:.2%}")
         
@@ -110,56 +171,50 @@ class RenkoStrategy:
         
         return portfolio 
 
-    def _init_portfolio(self, renko_data, initial_capital):
+    def _build_portfolio(self, renko_data, position, shares, cash):
+        """
+        由逐砖的仓位、股数、现金数组一次性组装portfolio
+        """
         portfolio = pd.DataFrame(index=renko_data.index)
         portfolio['index'] = renko_data['index']
         portfolio['date'] = renko_data['date']
         portfolio['holdings'] = 0.0
-        portfolio['shares'] = 0.0
-        portfolio['cash'] = 0.0
+        portfolio['shares'] = shares
+        portfolio['cash'] = cash
         portfolio['total'] = 0.0
-        portfolio['position'] = 0
-        portfolio.loc[portfolio.index[0], 'cash'] = initial_capital
-        portfolio.loc[portfolio.index[0], 'total'] = initial_capital
-        portfolio.loc[portfolio.index[0], 'position'] = 0
-        self.logger.info(f"初始化完成 - 日期: {portfolio.iloc[0]['date'].strftime('%Y-%m-%d')}, 现金: {initial_capital:,.2f}, 总资产: {initial_capital:,.2f}")
+        portfolio['position'] = position
+        self._update_equity(portfolio, renko_data)
         return portfolio
 
-    def _copy_prev_state(self, portfolio, current_idx, prev_idx):
-        for col in ['position', 'shares', 'cash']:
-            portfolio.loc[current_idx, col] = portfolio.loc[prev_idx, col]
-
-    def _execute_buy(self, portfolio, idx, price):
-        available_cash = portfolio.loc[idx, 'cash']
-        shares = (available_cash // (price * self.LOT_SIZE)) * self.LOT_SIZE
-        trade_amount = shares * price
-        commission = trade_amount * self.COMMISSION_BUY
-        total_cost = trade_amount + commission
-        portfolio.loc[idx, 'position'] = 1
-        portfolio.loc[idx, 'holdings'] = trade_amount
-        portfolio.loc[idx, 'shares'] = shares
-        portfolio.loc[idx, 'cash'] = available_cash - total_cost
-        self.logger.info(f"【B-执行买入】 - 日期: {portfolio.loc[idx, 'date'].strftime('%Y-%m-%d')}, 价格: {price:.2f}, 买入股数: {shares}, 买入金额: {trade_amount:,.2f}, 交易费用: {commission:,.2f}, 持仓市值: {portfolio.loc[idx, 'holdings']:,.2f}, 剩余现金: {portfolio.loc[idx, 'cash']:,.2f}")
-        return total_cost
-
-    def _execute_sell(self, portfolio, idx, price, buyin_cost):
-        sell_shares = portfolio.loc[idx, 'shares']
-        sell_amount = sell_shares * price
-        commission = sell_amount * self.COMMISSION_SELL
-        total_sell = sell_amount - commission
-        portfolio.loc[idx, 'position'] = 0
-        portfolio.loc[idx, 'cash'] += total_sell
-        portfolio.loc[idx, 'holdings'] = 0
-        portfolio.loc[idx, 'shares'] = 0
-        trade_return = (total_sell - buyin_cost) / buyin_cost if buyin_cost else 0
-        self.logger.info(f"【S-执行卖出】 - 日期: {portfolio.loc[idx, 'date'].strftime('%Y-%m-%d')}, 价格: {price:.2f}, 卖出股数: {sell_shares}, 卖出金额: {sell_amount:,.2f}, 交易费用: {commission:,.2f}, 持仓市值: {portfolio.loc[idx, 'holdings']:,.2f}, 现金: {portfolio.loc[idx, 'cash']:,.2f}, 本次交易收益率: {trade_return:.2%}")
-
-    def _update_holdings(self, portfolio, idx, price):
-        portfolio.loc[idx, 'holdings'] = portfolio.loc[idx, 'shares'] * price
-        self.logger.debug(f"【持仓收益】 - 日期: {portfolio.loc[idx, 'date'].strftime('%Y-%m-%d')}, 收盘价: {price:.2f}, 持仓市值: {portfolio.loc[idx, 'holdings']:,.2f}")
-
-    def _update_total(self, portfolio, idx):
-        portfolio.loc[idx, 'total'] = portfolio.loc[idx, 'holdings'] + portfolio.loc[idx, 'cash']
+    def _log_trades(self, dates, close, position, shares, cash):
+        """
+        根据结算后的仓位变化逐笔输出买卖明细
+        """
+        buyin_cost = 0
+        for i in np.flatnonzero(np.diff(position)) + 1:
+            date_str = dates.iloc[i].strftime('%Y-%m-%d')
+            price = close[i]
+            if position[i] == 1:
+                trade_amount = shares[i] * price
+                commission = trade_amount * self.COMMISSION_BUY
+                buyin_cost = trade_amount + commission
+                self.logger.info(f"【B-执行买入】 - 日期: {date_str}, 价格: {price:.2f}, 买入股数: {shares[i]}, 买入金额: {trade_amount:,.2f}, 交易费用: {commission:,.2f}, 持仓市值: {trade_amount:,.2f}, 剩余现金: {cash[i]:,.2f}")
+            else:
+                sell_amount = shares[i-1] * price
+                commission = sell_amount * self.COMMISSION_SELL
+                total_sell = sell_amount - commission
+                trade_return = (total_sell - buyin_cost) / buyin_cost if buyin_cost else 0
+                self.logger.info(f"【S-执行卖出】 - 日期: {date_str}, 价格: {price:.2f}, 卖出股数: {shares[i-1]}, 卖出金额: {sell_amount:,.2f}, 交易费用: {commission:,.2f}, 持仓市值: {0:,.2f}, 现金: {cash[i]:,.2f}, 本次交易收益率: {trade_return:.2%}")
+
+    def _update_equity(self, portfolio, renko_data):
+        """
+        整列计算持仓市值与总资产：持仓时市值为股数乘以收盘价，总资产为市值加现金
+        """
+        holding = portfolio['position'].to_numpy() == 1
+        shares = portfolio['shares'].to_numpy()
+        close = renko_data['close'].to_numpy()
+        portfolio['holdings'] = np.where(holding, shares * close, 0.0)
+        portfolio['total'] = portfolio['holdings'] + portfolio['cash']
 
     def _save_data(self, portfolio):
         """
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# src下的模块按顶层模块互相导入（如 from strategy import ...），data_fetcher/tools 则用 src.database
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, 'src'), os.path.join(ROOT_DIR, 'tools')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
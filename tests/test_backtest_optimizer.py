@@ -0,0 +1,50 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest_optimizer
+from backtest_optimizer import BacktestOptimizer
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _make_data(n=120, seed=0):
+    r = np.random.default_rng(seed)
+    close = np.abs(20 + np.cumsum(r.normal(0, 0.5, n)).round(2)) + 1
+    return pd.DataFrame({'Open': close, 'High': close + r.random(n), 'Low': close - r.random(n), 'Close': close,
+                         'Volume': r.integers(1, 1000, n)},
+                        index=pd.date_range('2024-01-01', periods=n, freq='B', name='Date'))
+
+
+def _make_optimizer(monkeypatch, **kwargs):
+    monkeypatch.chdir(ROOT_DIR)
+    args = argparse.Namespace(symbol='600000', start_date='2024-01-01', end_date='2024-06-01', threads=4,
+                              max_iterations=None, **kwargs)
+    return BacktestOptimizer(_make_data(), args)
+
+
+@pytest.mark.parametrize("kwargs, expected", [
+    ({}, 8),
+    ({'symbol_list': 'symbols.json', 'workers': 4}, 2),
+    ({'symbol_list': 'symbols.json', 'workers': 16}, 1),
+    ({'symbol_list': None, 'workers': 4}, 8),
+])
+def test_cpu_budget_shared_with_batch_workers(monkeypatch, kwargs, expected):
+    optimizer = _make_optimizer(monkeypatch, **kwargs)
+    monkeypatch.setattr(backtest_optimizer.os, 'cpu_count', lambda: 8)
+
+    assert optimizer._cpu_budget() == expected
+    assert optimizer._effective_workers(n_groups=9, cpu_budget=expected) == min(4, expected)
+
+
+def test_small_sweep_runs_in_process(monkeypatch):
+    optimizer = _make_optimizer(monkeypatch)
+    monkeypatch.setattr(optimizer, '_execute_in_pool', lambda *a: pytest.fail("small sweep should not start a pool"))
+
+    optimizer.run_optimization()
+
+    assert len(optimizer.results) == len(optimizer.returns) > 0
+    assert optimizer.get_best_result()['return'] == optimizer.returns.max()
@@ -0,0 +1,47 @@
+import pandas as pd
+
+from data_fetcher import DataFetcher
+
+
+def _make_df(start, end, close=1.0):
+    index = pd.date_range(start, end, freq='B', name='Date')
+    return pd.DataFrame({'Close': close}, index=index)
+
+
+def _make_fetcher(tmp_path):
+    return DataFetcher(cache_dir=str(tmp_path), use_db_cache=False, use_csv_cache=False)
+
+
+def test_memory_cache_slices_covering_entry(tmp_path):
+    fetcher = _make_fetcher(tmp_path)
+    fetcher._save_to_memory_cache(('600000.SS', '2024-01-01', '2024-03-29', '1d'), _make_df('2024-01-01', '2024-03-29'))
+    fetcher._save_to_memory_cache(('000001.SZ', '2024-01-01', '2024-12-31', '1d'), _make_df('2024-01-01', '2024-12-31'))
+
+    df = fetcher._get_from_memory_cache(('600000.SS', '2024-02-01', '2024-02-29', '1d'))
+
+    assert df.index.min() == pd.Timestamp('2024-02-01')
+    assert df.index.max() == pd.Timestamp('2024-02-29')
+    assert fetcher._get_from_memory_cache(('600000.SS', '2024-02-01', '2024-04-30', '1d')) is None
+    assert fetcher._get_from_memory_cache(('600000.SS', '2024-02-01', '2024-02-29', '1wk')) is None
+
+
+def test_memory_cache_eviction_updates_range_index(tmp_path, monkeypatch):
+    fetcher = _make_fetcher(tmp_path)
+    monkeypatch.setattr(fetcher, 'MAX_MEM_CACHE_ENTRIES', 1)
+    fetcher._save_to_memory_cache(('600000.SS', '2024-01-01', '2024-03-29', '1d'), _make_df('2024-01-01', '2024-03-29'))
+    fetcher._save_to_memory_cache(('000001.SZ', '2024-01-01', '2024-03-29', '1d'), _make_df('2024-01-01', '2024-03-29'))
+
+    assert ('600000.SS', '1d') not in fetcher.data_cache_ranges
+    assert fetcher._get_from_memory_cache(('600000.SS', '2024-02-01', '2024-02-29', '1d')) is None
+    assert fetcher.data_cache_bytes == sum(fetcher.data_cache_sizes.values())
+
+
+def test_memory_cache_drops_stale_entries_on_new_query_result(tmp_path):
+    fetcher = _make_fetcher(tmp_path)
+    fetcher._save_to_memory_cache(('600000.SS', '2024-01-01', '2024-03-29', '1d'), _make_df('2024-01-01', '2024-03-29', 1.0))
+
+    fetcher._save_query_result(_make_df('2024-03-01', '2024-03-29', 2.0), '600000.SS', '2024-03-01', '2024-03-29', '1d')
+
+    assert fetcher._get_from_memory_cache(('600000.SS', '2024-01-01', '2024-03-29', '1d')) is None
+    assert fetcher._get_from_memory_cache(('600000.SS', '2024-03-04', '2024-03-08', '1d'))['Close'].eq(2.0).all()
+    assert list(fetcher.data_cache) == [('600000.SS', '2024-03-01', '2024-03-29', '1d')]
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from src.database import DataBase, DataConverter, TableSchema
+
+COLUMNS = ["Date"] + DataConverter.VALUE_COLUMNS + ["Timestamp"]
+
+
+def _rows_to_df_rowwise(rows):
+    """逐行构造的参照实现"""
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df["Date"] = pd.to_datetime(df["Date"])
+    df.set_index("Date", inplace=True)
+    return df
+
+
+def _make_df():
+    index = pd.DatetimeIndex(pd.to_datetime(["2024-01-02", "2024-01-03", "2024-01-04"]), name="Date")
+    return pd.DataFrame({
+        "Open": [10.0, 10.5, 11.0],
+        "High": [10.8, 11.2, 11.5],
+        "Low": [9.9, 10.1, 10.7],
+        "Close": [10.5, 11.0, 11.2],
+        "Volume": [1000.0, np.nan, 1500.0],
+        "Turnover": [10500.0, 12000.0, 16800.0],
+        "Timestamp": ["2024-01-05 09:00:00"] * 3,
+    }, index=index)
+
+
+def test_db_round_trip(tmp_path):
+    db = DataBase(str(tmp_path / "hist.db"))
+    df = _make_df()
+    db.write_many([("600000.SS", df, False)], "1d")
+
+    fetched = db.fetch("600000.SS", "2024-01-01", "2024-01-31", "1d")
+    rows = DataConverter.df_to_db_records("600000.SS", df, "1d")
+    expected = _rows_to_df_rowwise([row[1:8] + row[9:] for row in rows])
+
+    pd.testing.assert_frame_equal(fetched, expected)
+    pd.testing.assert_frame_equal(fetched, df, check_index_type=False)
+    assert db.fetch_many(["600000.SS"], "2024-01-01", "2024-01-31", "1d")["600000.SS"].equals(fetched)
+
+
+def test_db_rows_to_df_empty():
+    pd.testing.assert_frame_equal(DataConverter.db_rows_to_df([]), _rows_to_df_rowwise([]))
+
+
+def test_db_rows_to_df_accepts_time_component(tmp_path):
+    db = DataBase(str(tmp_path / "hist.db"))
+    db.conn.execute(f"INSERT INTO {TableSchema.get_hist_data_table('1d')} VALUES "
+                    "('600000.SS', '2024-01-02 00:00:00', 1, 2, 0.5, 1.5, 100, 150, '1d', '2024-01-05 09:00:00')")
+    db.conn.commit()
+
+    fetched = db.fetch("600000.SS", "2024-01-01", "2024-01-31", "1d")
+
+    assert fetched.index.tolist() == [pd.Timestamp("2024-01-02")]
+    assert fetched["Close"].tolist() == [1.5]
@@ -0,0 +1,25 @@
+import numpy as np
+
+from strategy import _settle_trades
+
+
+def test_settle_trades_skips_buy_on_non_positive_close():
+    close = np.array([1., 0., 1.])
+    signal = np.array([0, 1, 0])
+
+    position, shares, cash = _settle_trades(close, signal, 1e6, 100, 0., 0.)
+
+    assert position.tolist() == [0, 0, 0]
+    assert shares.tolist() == [0., 0., 0.]
+    assert cash.tolist() == [1e6, 1e6, 1e6]
+
+
+def test_settle_trades_buys_and_sells_whole_lots():
+    close = np.array([10., 10., 12.])
+    signal = np.array([0, 1, -1])
+
+    position, shares, cash = _settle_trades(close, signal, 10050., 100, 0., 0.)
+
+    assert position.tolist() == [0, 1, 0]
+    assert shares.tolist() == [0., 1000., 0.]
+    assert cash.tolist() == [10050., 50., 12050.]
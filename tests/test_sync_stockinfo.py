@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("akshare")
+
+from sync_stockinfo import read_stock_info_csv
+
+
+def test_read_stock_info_csv_keeps_leading_zeros(tmp_path):
+    path = tmp_path / "stock_info_hk.csv"
+    path.write_text("代码,名称,最新价\n00700,腾讯控股,380.2\n000001,平安银行,10.5\n", encoding="utf-8")
+
+    df = read_stock_info_csv(str(path), "代码", "名称")
+
+    assert list(df.columns) == ["代码", "名称"]
+    assert df["代码"].tolist() == ["00700", "000001"]
+    assert (df["代码"].astype(str) + ".HK").tolist() == ["00700.HK", "000001.HK"]
@@ -4,7 +4,10 @@ import argparse
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import akshare as ak
 import json
+import pickle
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from src.database import DataBase
 import logging
 
@@ -24,8 +27,18 @@ FILE_STOCK_INFO_SH_KCB = os.path.join(DATA_DIR, "stock_info_sh_kcb.csv")
 FILE_STOCK_INFO_SZ = os.path.join(DATA_DIR, "stock_info_sz.csv")
 FILE_STOCK_INFO_HK = os.path.join(DATA_DIR, "stock_info_hk.csv")
 FILE_STOCK_INFO_AH_CODE_NAME = os.path.join(DATA_DIR, "stock_info_ah_symbol_name.csv")
+FILE_STOCK_INFO_AH_CODE_NAME_PKL = os.path.join(DATA_DIR, "stock_info_ah_symbol_name.pkl")
 FILE_STOCK_AH_SYMBOLS_ALL = os.path.join(DATA_DIR, "stock_ah_symbols_all.json")
 
+def read_stock_info_csv(path, code_col, name_col):
+    """
+    用pyarrow读取股票信息csv，只解析代码和名称两列。
+    列类型在解析时即指定为字符串，避免代码被推断为整数而丢失前导零。
+    """
+    convert_options = pacsv.ConvertOptions(include_columns=[code_col, name_col],
+                                           column_types={code_col: pa.string(), name_col: pa.string()})
+    return pacsv.read_csv(path, convert_options=convert_options).to_pandas()
+
 def fetch_and_save_stock_info(force=False):
     """
     获取A股、科创板、深市、港股的股票信息，保存为csv和json文件。
@@ -36,35 +49,35 @@ def fetch_and_save_stock_info(force=False):
         stock_info_sh_df["证券代码"] = stock_info_sh_df["证券代码"].astype(str)
         stock_info_sh_df.to_csv(FILE_STOCK_INFO_SH, index=False)
     else:
-        stock_info_sh_df = pd.read_csv(FILE_STOCK_INFO_SH, dtype={"证券代码": str})
+        stock_info_sh_df = read_stock_info_csv(FILE_STOCK_INFO_SH, "证券代码", "证券简称")
 
     if force or not os.path.exists(FILE_STOCK_INFO_SH_KCB):
         stock_info_sh_df_kcb = ak.stock_info_sh_name_code(symbol="科创板")
         stock_info_sh_df_kcb["证券代码"] = stock_info_sh_df_kcb["证券代码"].astype(str)
         stock_info_sh_df_kcb.to_csv(FILE_STOCK_INFO_SH_KCB, index=False)
     else:
-        stock_info_sh_df_kcb = pd.read_csv(FILE_STOCK_INFO_SH_KCB, dtype={"证券代码": str})
+        stock_info_sh_df_kcb = read_stock_info_csv(FILE_STOCK_INFO_SH_KCB, "证券代码", "证券简称")
 
     if force or not os.path.exists(FILE_STOCK_INFO_SZ):
         stock_info_sz_df = ak.stock_info_sz_name_code(symbol="A股列表")
         stock_info_sz_df["A股代码"] = stock_info_sz_df["A股代码"].astype(str)
         stock_info_sz_df.to_csv(FILE_STOCK_INFO_SZ, index=False)
     else:
-        stock_info_sz_df = pd.read_csv(FILE_STOCK_INFO_SZ, dtype={"A股代码": str})
+        stock_info_sz_df = read_stock_info_csv(FILE_STOCK_INFO_SZ, "A股代码", "A股简称")
 
     if force or not os.path.exists(FILE_STOCK_INFO_HK):
         stock_info_hk_df = ak.stock_hk_spot_em()
         stock_info_hk_df['代码'] = stock_info_hk_df['代码'].astype(str)
         stock_info_hk_df.to_csv(FILE_STOCK_INFO_HK, index=False)
     else:
-        stock_info_hk_df = pd.read_csv(FILE_STOCK_INFO_HK, dtype={"代码": str})
+        stock_info_hk_df = read_stock_info_csv(FILE_STOCK_INFO_HK, "代码", "名称")
 
     # 统一字段名
     sh_df = stock_info_sh_df.rename(columns={"证券代码": "symbol", "证券简称": "name"})[["symbol", "name"]]
     kcb_df = stock_info_sh_df_kcb.rename(columns={"证券代码": "symbol", "证券简称": "name"})[["symbol", "name"]]
     sz_df = stock_info_sz_df.rename(columns={"A股代码": "symbol", "A股简称": "name"})[["symbol", "name"]]
     hk_df = stock_info_hk_df.rename(columns={"代码": "symbol", "名称": "name"})[["symbol", "name"]]
-    hk_df['symbol'] = hk_df['symbol'].apply(lambda x: f"{x}.HK")
+    hk_df['symbol'] = hk_df['symbol'].astype(str) + ".HK"
 
     # 合并
     all_df = pd.concat([sh_df, kcb_df, sz_df, hk_df], ignore_index=True)
@@ -75,6 +88,10 @@ def fetch_and_save_stock_info(force=False):
     # 保存到数据库
     STOCK_HIST_DATA_DB.update_stock_info(all_df)
 
+    # 数据库中的symbol -> name字典保存为pickle，DataFetcher.init_stock_info优先读取，避免每次从数据库重建
+    with open(FILE_STOCK_INFO_AH_CODE_NAME_PKL, 'wb') as f:
+        pickle.dump(dict(STOCK_HIST_DATA_DB.get_all_stock_info()), f, protocol=pickle.HIGHEST_PROTOCOL)
+
     # code单独保存为json
     with open(FILE_STOCK_AH_SYMBOLS_ALL, 'w', encoding='utf-8') as f:
         json.dump(all_df['symbol'].tolist(), f, ensure_ascii=False, indent=2)